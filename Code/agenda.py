@@ -0,0 +1,180 @@
+import heapq
+import itertools
+from typing import Dict, List, Optional, Tuple
+
+WALKING = "walking"  # Heading for target_stop; position is derived from the tick of the last update
+WAITING = "waiting"  # At target_stop; waiting_time is derived from the tick of the last update
+RIDING = "riding"  # On a bus; woken when the bus reaches the destination or stops on a blocked route
+
+
+def _steps_to_destination(position: Tuple[int, int], target: Tuple[int, int], destination: Tuple[int, int]) -> Optional[int]:
+    """Steps after which a walker heading diagonally from position to target stands on destination, if ever."""
+    steps = max(abs(target[0] - position[0]), abs(target[1] - position[1]))
+    first, last = 1, steps  # Steps at which both coordinates can match
+    for start, end, goal in zip(position, target, destination):
+        if goal == end:
+            first = max(first, abs(goal - start))  # Matches once this coordinate has arrived
+        elif (goal - start) * (end - start) > 0 and abs(goal - start) < abs(end - start):
+            first, last = max(first, abs(goal - start)), min(last, abs(goal - start))  # Passed on the way
+        else:
+            return None
+    return first if first <= last else None
+
+
+class PassengerAgenda:
+    """Update only the passengers that have something happening at this step.
+
+    Between events a passenger's update is predictable: a walker takes one diagonal step towards
+    target_stop and a waiting passenger counts one more step. The agenda keeps a priority queue of
+    the next step at which that stops being true (a walker reaches target_stop or crosses their
+    destination, which ends the journey; a waiting passenger runs out of patience) and wakes passengers early when a bus stands at their stop or, for riders,
+    at their destination or on a blocked route. A woken passenger is first brought up to date and
+    then runs the ordinary Passenger.update, so a run gives the same results as updating everyone.
+
+    Fields of passengers that are not woken lag behind; sync() brings them all up to date.
+    """
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.queue: List[Tuple[int, int, object]] = []  # (step, tie-breaker, passenger) of each passenger's next event
+        self.due: Dict[object, int] = {}  # Passenger -> step of their live queue entry; others are stale
+        self.sequence: Dict[object, int] = {}  # Passenger -> order in which they were added
+        self.state: Dict[object, Tuple[str, int, object]] = {}  # Passenger -> (state, step last updated, stop or bus)
+        self.waiting: Dict[Tuple[int, int], Dict] = {}  # Stop -> passengers waiting there (dict as ordered set)
+        self.riders: Dict[object, Dict[Tuple[int, int], Dict]] = {}  # Bus -> destination -> riders
+        self.alighted: List = []  # Riders put off a bus by a blocked route this step
+        self.woken: List = []  # Passengers updated this step
+        self.updates = 0  # Passenger updates run in total
+        # Passengers seen so far, retired ones included; those already in the list get their first update next step
+        self._known = len(simulation.archive)
+        self._order = itertools.count()
+
+    def stranded(self, bus, position: Tuple[int, int]):
+        """The riders of a bus on a blocked route are about to get off where the bus was at the last update."""
+        for passenger in bus.passengers:
+            if not passenger.journey_complete:
+                passenger.current_position = position
+            self.alighted.append(passenger)
+
+    def retire(self, passenger):
+        """Forget a finished passenger moved to the archive."""
+        if self.sequence.pop(passenger, None) is None:
+            self._known += 1  # Archived before the agenda saw them; they still count as seen
+
+    def _wake_list(self, step: int) -> List:
+        """Everyone with an event at this step, in passenger order."""
+        woken = {}
+        passengers = self.simulation.passengers
+        retired = len(self.simulation.archive)
+        for index in range(self._known - retired, len(passengers)):
+            self.sequence[passengers[index]] = retired + index
+            woken[passengers[index]] = None
+        self._known = retired + len(passengers)
+
+        queue = self.queue
+        while queue and queue[0][0] <= step:
+            due_step, _, passenger = heapq.heappop(queue)
+            if self.due.get(passenger) == due_step:
+                del self.due[passenger]
+                woken[passenger] = None
+
+        for bus in self.simulation.buses:
+            waiting = self.waiting.get(bus.position)
+            if waiting:
+                woken.update(waiting)
+            riders = self.riders.get(bus)
+            if riders and bus.position in riders:
+                woken.update(riders[bus.position])
+        woken.update(dict.fromkeys(self.alighted))
+        self.alighted = []
+        return sorted(woken, key=self.sequence.__getitem__)
+
+    def _forget(self, passenger):
+        """Take a passenger out of the waiting and riding registries before an update."""
+        state = self.state.pop(passenger, None)
+        if state is None:
+            return
+        kind, _, where = state
+        if kind == WAITING:
+            self.waiting[where].pop(passenger, None)
+            if not self.waiting[where]:
+                del self.waiting[where]
+        elif kind == RIDING:
+            riders = self.riders[where]
+            riders[passenger.destination].pop(passenger, None)
+            if not riders[passenger.destination]:
+                del riders[passenger.destination]
+
+    def _catch_up(self, passenger, state: Tuple[str, int, object], steps: int):
+        """Apply the updates skipped over the given number of steps."""
+        kind, _, where = state
+        if kind == WALKING:
+            (x, y), (tx, ty) = passenger.current_position, passenger.target_stop
+            arrival = _steps_to_destination((x, y), (tx, ty), passenger.destination)
+            if arrival is not None and arrival <= steps:
+                passenger.current_position = passenger.destination  # The walk ends there, like Passenger.update
+                passenger.journey_complete = True
+                return
+            x += max(-steps, min(steps, tx - x))
+            y += max(-steps, min(steps, ty - y))
+            passenger.current_position = (x, y)
+        elif kind == WAITING:
+            passenger.waiting_time += steps
+            passenger.ready_to_board = True
+        elif kind == RIDING and passenger.on_bus is not None and not passenger.journey_complete:
+            passenger.current_position = passenger.on_bus.position
+
+    def update(self, step: int):
+        """Update the passengers with an event at this step and note who may board, like update_passengers."""
+        simulation = self.simulation
+        simulation.waiting_at = {}
+        metrics = simulation.metrics
+        self.woken = self._wake_list(step)
+        for passenger in self.woken:
+            self.due.pop(passenger, None)  # Whatever woke them, the queued event is handled
+            was_complete = passenger.journey_complete
+            state = self.state.get(passenger)
+            if state is not None:
+                self._catch_up(passenger, state, step - 1 - state[1])
+                self._forget(passenger)
+            passenger.update(simulation.buses, step, board=False, route_index=simulation.route_index)
+            if passenger.ready_to_board:
+                simulation.waiting_at.setdefault(passenger.current_position, []).append(passenger)
+            if passenger.journey_complete and not was_complete:
+                simulation.total_passenger_transport += 1
+                metrics.record_completion(passenger.get_travel_time())
+        self.updates += len(self.woken)
+
+    def schedule(self, step: int):
+        """After boarding, queue the next event of every passenger updated this step."""
+        for passenger in self.woken:
+            bus = passenger.on_bus
+            if bus is not None:
+                self.state[passenger] = (RIDING, step, bus)
+                self.riders.setdefault(bus, {}).setdefault(passenger.destination, {})[passenger] = None
+            elif passenger.journey_complete:
+                continue  # Nothing more happens unless a bus they are still aboard puts them off
+            elif passenger.target_stop is None:
+                self._push(passenger, step + 1)
+            elif passenger.current_position != passenger.target_stop:
+                (x, y), (tx, ty) = passenger.current_position, passenger.target_stop
+                self.state[passenger] = (WALKING, step, None)
+                arrival = _steps_to_destination((x, y), (tx, ty), passenger.destination)
+                # The step that reaches the stop, or the destination if the walk crosses it first
+                self._push(passenger, step + (arrival if arrival is not None else max(abs(tx - x), abs(ty - y))))
+            else:
+                self.state[passenger] = (WAITING, step, passenger.target_stop)
+                self.waiting.setdefault(passenger.target_stop, {})[passenger] = None
+                self._push(passenger, step + passenger.max_waiting_time + 1 - passenger.waiting_time)
+        self.woken = []
+
+    def _push(self, passenger, step: int):
+        self.due[passenger] = step
+        heapq.heappush(self.queue, (step, next(self._order), passenger))
+
+    def sync(self, step: int):
+        """Bring every passenger's position and waiting time up to date, e.g. before drawing or saving."""
+        for passenger, state in self.state.items():
+            if state[1] < step:
+                self._catch_up(passenger, state, step - state[1])
+                self.state[passenger] = (state[0], step, state[2])
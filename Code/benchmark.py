@@ -0,0 +1,239 @@
+import argparse
+import heapq
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import events
+import routing
+from checkpoint import fork
+from model import Passenger, add_random_blocked_route
+from scenario import build_random_simulation
+
+# Synthetic cities from the default 10x10 setup up to a metropolitan grid
+SCALES = {
+    "tiny": {"size": 10, "n_stops": 8, "fleet": 2, "route_length": 4, "passengers": 0, "queries": 200, "steps": 200},
+    "small": {"size": 50, "n_stops": 40, "fleet": 20, "route_length": 6, "passengers": 1000, "queries": 100, "steps": 50},
+    "medium": {"size": 200, "n_stops": 200, "fleet": 200, "route_length": 8, "passengers": 10000, "queries": 30, "steps": 10},
+    "large": {"size": 500, "n_stops": 1000, "fleet": 1000, "route_length": 10, "passengers": 50000, "queries": 10, "steps": 5},
+    "metro": {"size": 1000, "n_stops": 4000, "fleet": 3000, "route_length": 12, "passengers": 100000, "queries": 5, "steps": 3},
+}
+DEFAULT_SCALES = ["tiny", "small", "medium"]
+
+
+def build_scenario(scale: Dict, seed: int, routing_strategy: str = "dijkstra"):
+    """Build a synthetic simulation for a scale, with its initial passengers and a few blockages in place."""
+    rng = random.Random(seed)
+    simulation = build_random_simulation(scale["size"], scale["size"], scale["n_stops"], scale["fleet"],
+                                         scale["route_length"], rng=rng, routing_strategy=routing_strategy)
+    for passenger_id in range(1, scale["passengers"] + 1):
+        simulation.passengers.append(Passenger(passenger_id, rng.choice(simulation.city.bus_stops),
+                                               rng.choice(simulation.city.bus_stops)))
+    for _ in range(10):
+        add_random_blocked_route(simulation.city)
+    return simulation
+
+
+def summarize(rounds: List[List[float]]) -> Dict:
+    """Summarize timings, given as rounds of comparable samples, in milliseconds.
+
+    spread_ms is the gap between the lowest and highest round median: the run-to-run noise
+    that compare() tolerates for this metric.
+    """
+    samples = [sample for samples in rounds for sample in samples]
+    ordered = sorted(samples)
+    medians = [statistics.median(samples) for samples in rounds if samples]
+    return {
+        "calls": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "median_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "spread_ms": (max(medians) - min(medians)) * 1000,
+    }
+
+
+def bench_routing(simulation, queries: int, rng: random.Random, strategies: List[str], repeats: int = 5) -> Dict:
+    """Time routing calls between random stop pairs for each strategy, over repeats rounds of all the pairs.
+
+    An untimed round first warms up whatever the strategy caches.
+    """
+    stops = simulation.city.bus_stops
+    pairs = [(rng.choice(stops), rng.choice(stops)) for _ in range(queries)]
+    results = {}
+    for strategy in strategies:
+        expanded = 0
+        for start, goal in pairs:
+            expanded += routing.search(start, goal, simulation.city, strategy).expanded
+        rounds = []
+        for _ in range(repeats):
+            samples = []
+            for start, goal in pairs:
+                begin = time.perf_counter()
+                routing.search(start, goal, simulation.city, strategy)
+                samples.append(time.perf_counter() - begin)
+            rounds.append(samples)
+        results[strategy] = summarize(rounds)
+        results[strategy]["mean_expanded"] = expanded / len(pairs)
+    return results
+
+
+def bench_steps(simulation, steps: int, rounds: int = 5) -> Dict:
+    """Time full Simulation.run_step calls and, inside them, each boarding pass.
+
+    Each round runs the same steps on its own copy of the simulation (checkpoint.fork keeps the
+    random state), so the rounds do identical work and differ only by timing noise.
+    """
+    boarding_rounds, step_rounds = [], []
+    for _ in range(rounds):
+        copy = fork(simulation)
+        boarding_samples, step_samples = [], []
+        board_waiting_passengers = copy.board_waiting_passengers
+
+        def timed_boarding():
+            begin = time.perf_counter()
+            board_waiting_passengers()
+            boarding_samples.append(time.perf_counter() - begin)
+
+        copy.board_waiting_passengers = timed_boarding  # Wrap the bound method on this instance only
+        for _ in range(steps):
+            begin = time.perf_counter()
+            copy.run_step()
+            step_samples.append(time.perf_counter() - begin)
+        boarding_rounds.append(boarding_samples)
+        step_rounds.append(step_samples)
+    return {"boarding": summarize(boarding_rounds), "step": summarize(step_rounds)}
+
+
+def calibrate(rounds: int = 7) -> float:
+    """Median milliseconds of a fixed pure-Python workload (heap and dict operations, like a search).
+
+    compare() scales the baseline by the ratio of two runs' calibrations, so a machine that runs
+    slower or faster overall than when the baseline was saved does not read as a regression.
+    """
+    samples = []
+    for _ in range(rounds):
+        begin = time.perf_counter()
+        heap, seen = [], {}
+        for value in range(20000):
+            key = value * 7919 % 20011
+            heapq.heappush(heap, (key, value))
+            seen[key] = value
+        while heap:
+            seen.pop(heapq.heappop(heap)[0], None)
+        samples.append(time.perf_counter() - begin)
+    return statistics.median(samples) * 1000
+
+
+def run_benchmarks(scale_names: List[str], seed: int = 0, strategies: List[str] = None,
+                   fleet_routing: str = "dijkstra", repeats: int = 5) -> Dict:
+    """Run the routing, boarding and step benchmarks at each scale and return the results."""
+    strategies = strategies or sorted(routing.STRATEGIES)
+    results = {
+        "meta": {"python": platform.python_version(), "machine": platform.machine(), "seed": seed,
+                 "fleet_routing": fleet_routing, "repeats": repeats},
+        "scales": {},
+    }
+    calibration = calibrate()
+    previous_sink = events.quiet()
+    try:
+        for name in scale_names:
+            scale = SCALES[name]
+            begin = time.perf_counter()
+            simulation = build_scenario(scale, seed, fleet_routing)
+            build_seconds = time.perf_counter() - begin
+            scale_results = {"config": scale, "build_seconds": build_seconds}
+            scale_results["routing"] = bench_routing(simulation, scale["queries"], random.Random(seed), strategies,
+                                                    repeats)
+            scale_results.update(bench_steps(simulation, scale["steps"], repeats))
+            results["scales"][name] = scale_results
+            print(f"{name}: step median {scale_results['step']['median_ms']:.2f} ms, "
+                  f"boarding median {scale_results['boarding']['median_ms']:.3f} ms", file=sys.stderr)
+    finally:
+        events.set_sink(previous_sink)
+    results["meta"]["calibration_ms"] = (calibration + calibrate()) / 2  # Before and after, for drift during the run
+    return results
+
+
+def timing_metrics(results: Dict) -> Dict[str, Dict]:
+    """Flatten the timing summaries into 'scale.section[.strategy]' keys for baseline comparison."""
+    metrics = {}
+    for name, scale_results in results["scales"].items():
+        for strategy, timing in scale_results["routing"].items():
+            metrics[f"{name}.routing.{strategy}"] = timing
+        metrics[f"{name}.boarding"] = scale_results["boarding"]
+        metrics[f"{name}.step"] = scale_results["step"]
+    return metrics
+
+
+def compare(results: Dict, baseline: Dict, threshold: float, noise: float = 2.0,
+            min_delta_ms: float = 0.0005) -> Tuple[List[str], List[str]]:
+    """Return the timings that got slower than threshold times the baseline, and those not compared.
+
+    Baseline timings are first scaled by the ratio of the two runs' calibrations. Each metric then
+    has its own noise floor: a slowdown also has to exceed noise times the larger of the two runs'
+    spreads between rounds (and min_delta_ms, for timer resolution). Metrics missing from the
+    baseline, or stored without a spread by an older version, are skipped.
+    """
+    current = timing_metrics(results)
+    reference = timing_metrics(baseline)
+    speed = 1.0
+    if "calibration_ms" in baseline["meta"] and "calibration_ms" in results["meta"]:
+        speed = results["meta"]["calibration_ms"] / baseline["meta"]["calibration_ms"]
+    regressions = []
+    skipped = []
+    for key, timing in sorted(current.items()):
+        if key not in reference or "spread_ms" not in reference[key]:
+            skipped.append(key)
+            continue
+        value, base = timing["median_ms"], reference[key]["median_ms"] * speed
+        floor = max(noise * max(timing["spread_ms"], reference[key]["spread_ms"] * speed), min_delta_ms)
+        if value > base * threshold and value - base > floor:
+            regressions.append(f"{key}: {value:.3f} ms vs baseline {base:.3f} ms (calibrated) "
+                               f"({value / base:.2f}x, threshold {threshold:.2f}x, noise floor {floor:.3f} ms)")
+    return regressions, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark routing, boarding and full steps on synthetic cities.")
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, choices=list(SCALES))
+    parser.add_argument("--strategies", nargs="+", default=None, choices=sorted(routing.STRATEGIES))
+    parser.add_argument("--fleet-routing", default="dijkstra", help="routing strategy the buses use during steps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="where to write the results")
+    parser.add_argument("--baseline", help="stored results to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="allowed slowdown factor before failing")
+    parser.add_argument("--noise", type=float, default=2.0,
+                        help="a slowdown must exceed this many times a metric's spread between rounds")
+    parser.add_argument("--min-delta-ms", type=float, default=0.0005, help="ignore slowdowns smaller than this")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="rounds of routing queries, and of steps, used for medians and spreads")
+    parser.add_argument("--save-baseline", help="also store these results as the new baseline at this path")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, args.seed, args.strategies, args.fleet_routing, args.repeats)
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(results, output, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions, skipped = compare(results, baseline, args.threshold, args.noise, args.min_delta_ms)
+        if skipped:
+            print(f"Not in the baseline (or saved without spreads), not compared: {', '.join(skipped)}", file=sys.stderr)
+        if regressions:
+            print("Performance regressions:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression}", file=sys.stderr)
+            sys.exit(1)
+        print("No regressions against the baseline.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+import gc
+import itertools
+import json
+import mmap
+import random
+import struct
+import sys
+from array import array
+from typing import Dict, Optional
+
+from archive import COLUMNS as ARCHIVE_COLUMNS
+from demand import RandomDemand, TripDemand, open_trips
+from disturbances import Corridors, DisturbanceGenerator, Hotspots, TimeOfDay, Uniform
+from metrics import MetricsAccumulator, StreamingHistogram
+from model import City, Passenger, PublicTransport, Simulation
+
+MAGIC = b"BUSCKPT1"  # File signature and format version
+ALIGNMENT = 8  # Every column starts on a multiple of this, so it can be viewed in place
+NONE = -1  # Column value standing for None (no target stop, no time, no bus)
+
+# Passenger columns: name -> array typecode
+PASSENGER_COLUMNS = {
+    "id": "q",
+    "origin_x": "i", "origin_y": "i",
+    "x": "i", "y": "i",
+    "dest_x": "i", "dest_y": "i",
+    "target_x": "i", "target_y": "i",
+    "waiting_time": "i",
+    "max_waiting_time": "i",
+    "journey_complete": "B",
+    "ready_to_board": "B",
+    "start_time": "i", "end_time": "i",
+    "on_bus": "i",  # Index of Passenger.on_bus in the bus list
+    "riding": "i",  # Index of the bus whose load holds the passenger (usually on_bus)
+    "seat": "i",  # Order in which the passenger boarded that bus
+}
+# PassengerEngine columns stored as they are
+ENGINE_COLUMNS = ["ids", "x", "y", "dest_x", "dest_y", "dest_key", "target_x", "target_y",
+                  "waiting", "max_waiting", "state", "bus", "start_time", "end_time"]
+
+
+def _optional(value) -> int:
+    return NONE if value is None else value
+
+
+def _histogram_state(histogram: StreamingHistogram) -> Dict:
+    state = dict(vars(histogram))
+    state["buckets"] = list(histogram.buckets.items())  # JSON object keys would turn into strings
+    return state
+
+
+def _metrics_state(metrics: MetricsAccumulator) -> Dict:
+    state = {name: value for name, value in vars(metrics).items() if not isinstance(value, (StreamingHistogram, dict))}
+    state["histograms"] = {name: _histogram_state(value) for name, value in vars(metrics).items()
+                           if isinstance(value, StreamingHistogram)}
+    state["stop_service"] = [[*stop, count] for stop, count in metrics.stop_service.items()]
+    state["stop_reached"] = [[*stop, *order] for stop, order in metrics.stop_reached.items()]
+    return state
+
+
+def _restore_metrics(state: Dict) -> MetricsAccumulator:
+    metrics = MetricsAccumulator(state["grid_size"])
+    for name, value in state.items():
+        if name == "histograms":
+            for histogram_name, histogram_state in value.items():
+                histogram = getattr(metrics, histogram_name)
+                histogram.__dict__.update(histogram_state)
+                histogram.buckets = dict(histogram_state["buckets"])
+        elif name == "stop_service":
+            metrics.stop_service = {(x, y): count for x, y, count in value}
+        elif name == "stop_reached":
+            metrics.stop_reached = {(x, y): (step, order) for x, y, step, order in value}
+        elif name == "busiest_stop":
+            metrics.busiest_stop = tuple(value) if value is not None else None
+        else:
+            setattr(metrics, name, value)
+    return metrics
+
+
+def _disturbance_state(generator: DisturbanceGenerator) -> Dict:
+    distribution, rate = generator.distribution, generator.rate
+    if type(distribution) is Uniform:
+        state = {"distribution": "uniform"}
+    elif type(distribution) is Hotspots:
+        state = {"distribution": "hotspots", "centers": distribution.centers, "radius": distribution.radius,
+                 "share": distribution.share}
+    elif type(distribution) is Corridors:
+        state = {"distribution": "corridors", "corridors": distribution.corridors, "share": distribution.share}
+    else:
+        raise ValueError(f"cannot checkpoint the disturbance distribution {distribution!r}")
+    if rate is not None and type(rate) is not TimeOfDay:
+        raise ValueError(f"cannot checkpoint the disturbance rate {rate!r}; use disturbances.time_of_day")
+    state["rate"] = [rate.profile, rate.period] if rate is not None else None
+    state["max_blocked"] = generator.max_blocked
+    return state
+
+
+def _restore_disturbances(state: Dict, city: City) -> DisturbanceGenerator:
+    kind = state["distribution"]
+    if kind == "hotspots":
+        distribution = Hotspots([tuple(center) for center in state["centers"]], state["radius"], state["share"])
+    elif kind == "corridors":
+        distribution = Corridors([(tuple(start), tuple(end)) for start, end in state["corridors"]], state["share"])
+    else:
+        distribution = Uniform()
+    rate = TimeOfDay(*state["rate"]) if state["rate"] is not None else None
+    return DisturbanceGenerator(city, distribution, rate, state["max_blocked"])
+
+
+def _demand_state(demand) -> Optional[Dict]:
+    if demand is None:
+        return None
+    if type(demand) is RandomDemand:
+        return {"kind": "random", "rate": demand.rate}
+    if type(demand) is TripDemand and demand.path is not None:
+        return {"kind": "trips", "path": demand.path, "snap": demand.snap, "delivered": demand.delivered,
+                "snapped": demand.snapped}
+    raise ValueError(f"cannot checkpoint the demand source {demand!r}; replay trips with demand.open_trips")
+
+
+def _restore_demand(state: Optional[Dict]):
+    if state is None:
+        return None
+    if state["kind"] == "random":
+        return RandomDemand(state["rate"])
+    demand = open_trips(state["path"], state["snap"])
+    demand.skip(state["delivered"])  # Trips already turned into passengers
+    demand.snapped = state["snapped"]
+    return demand
+
+
+def _rng_state(rng) -> list:
+    version, internal, gauss = rng.getstate()
+    return [version, list(internal), gauss]
+
+
+def dumps(simulation: Simulation) -> bytes:
+    """Serialize a simulation: a JSON header for the city, buses and counters, then packed columns.
+
+    Raises ValueError if the disturbance distribution or rate, or the demand source, is of a kind
+    the header cannot describe (see Checkpoint.restore).
+    """
+    simulation.sync_passengers()
+    city = simulation.city
+    buses = simulation.buses
+    bus_index = {id(bus): index for index, bus in enumerate(buses)}
+
+    passengers = simulation.passengers
+    columns = {name: array(typecode, bytes(array(typecode, [0]).itemsize * len(passengers)))
+               for name, typecode in PASSENGER_COLUMNS.items()}
+    riding = {}  # Passenger -> (bus index, seat)
+    for index, bus in enumerate(buses):
+        for seat, passenger in enumerate(bus.passengers):
+            riding[id(passenger)] = (index, seat)
+    for row, passenger in enumerate(passengers):
+        columns["id"][row] = passenger.id
+        columns["origin_x"][row], columns["origin_y"][row] = passenger.origin
+        columns["x"][row], columns["y"][row] = passenger.current_position
+        columns["dest_x"][row], columns["dest_y"][row] = passenger.destination
+        columns["target_x"][row], columns["target_y"][row] = passenger.target_stop or (NONE, NONE)
+        columns["waiting_time"][row] = passenger.waiting_time
+        columns["max_waiting_time"][row] = passenger.max_waiting_time
+        columns["journey_complete"][row] = passenger.journey_complete
+        columns["ready_to_board"][row] = passenger.ready_to_board
+        columns["start_time"][row] = _optional(passenger.start_time)
+        columns["end_time"][row] = _optional(passenger.end_time)
+        columns["on_bus"][row] = bus_index[id(passenger.on_bus)] if passenger.on_bus is not None else NONE
+        columns["riding"][row], columns["seat"][row] = riding.get(id(passenger), (NONE, NONE))
+    columns = {f"passengers.{name}": column for name, column in columns.items()}
+    columns.update({f"archive.{name}": column for name, column in simulation.archive.columns.items()})
+    columns["city.grid"] = city.grid
+
+    header = {
+        "byteorder": sys.byteorder,
+        "city": {
+            "width": city.width,
+            "height": city.height,
+            "bus_stops": city.bus_stops,
+            "blocked_routes": [[*start, *end, duration, counter]
+                               for (start, end), (duration, counter) in city.blocked_routes.items()],
+            "blocked_version": city.blocked_version,
+        },
+        "rng": _rng_state(simulation.rng),
+        "simulation": {
+            "step_count": simulation.step_count,
+            "unblock_counter": simulation.unblock_counter,
+            "total_passenger_transport": simulation.total_passenger_transport,
+            "blockage_interval": simulation.blockage_interval,
+            "retire_interval": simulation.retire_interval,
+        },
+        "metrics": _metrics_state(simulation.metrics),
+        "disturbances": _disturbance_state(simulation.disturbances),
+        "demand": _demand_state(simulation.demand),
+        "agenda": {"updates": simulation.agenda.updates} if simulation.agenda is not None else None,
+        "buses": [{
+            "id": bus.id,
+            "route": bus.route,
+            "routing_strategy": bus.routing_strategy,
+            "position": bus.position,
+            "route_index": bus.route_index,
+            "path": bus.path,
+            "path_step": bus.path_step,
+            "path_version": bus.path_version,
+            "served_stops": bus.served_stops,
+            "total_passenger_loads": bus.total_passenger_loads,
+            "routing_calls": bus.routing_calls,
+            "nodes_expanded": bus.nodes_expanded,
+        } for bus in buses],
+        "passengers": len(passengers),
+        "engine": None,
+        "columns": {},
+    }
+
+    engine = simulation.passenger_engine
+    if engine is not None:
+        header["engine"] = {
+            "size": engine.size,
+            "destinations": sorted(engine._destination_keys, key=engine._destination_keys.get),
+        }
+        for name in ENGINE_COLUMNS:
+            columns[f"engine.{name}"] = getattr(engine, name)[:engine.size]
+
+    # Lay the columns out one after another, each padded to the alignment
+    offset = 0
+    for name, column in columns.items():
+        data = memoryview(column).cast("B")
+        header["columns"][name] = [memoryview(column).format, offset, len(data)]
+        offset += -(-len(data) // ALIGNMENT) * ALIGNMENT
+
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(len(MAGIC) + 8 + len(header_bytes)) % ALIGNMENT)
+    chunks = [MAGIC, struct.pack("<Q", len(header_bytes)), header_bytes]
+    for column in columns.values():
+        data = memoryview(column).cast("B")
+        chunks.append(data)
+        chunks.append(b"\0" * (-len(data) % ALIGNMENT))
+    return b"".join(chunks)
+
+
+def save(simulation: Simulation, path: str):
+    """Write a checkpoint of the simulation to path."""
+    with open(path, "wb") as output:
+        output.write(dumps(simulation))
+
+
+class Checkpoint:
+    """A checkpoint opened in place: the header is parsed, the columns are views into the buffer.
+
+    Opening costs only the header, however many passengers the file holds, and restore() can be
+    called any number of times to branch independent simulations from the same state.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        view = memoryview(buffer)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a simulation checkpoint")
+        (header_length,) = struct.unpack_from("<Q", view, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header = json.loads(bytes(view[start:start + header_length]))
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"checkpoint was written on a {self.header['byteorder']}-endian machine")
+        self._data = view[start + header_length:]
+
+    @property
+    def step(self) -> int:
+        return self.header["simulation"]["step_count"]
+
+    def column(self, name: str) -> memoryview:
+        """Typed view of a stored column, without copying it."""
+        typecode, offset, length = self.header["columns"][name]
+        return self._data[offset:offset + length].cast(typecode)
+
+    def restore(self, rng: Optional[random.Random] = None) -> Simulation:
+        """Build a new simulation in the checkpointed state.
+
+        The random generator resumes from the saved state unless rng is given, e.g. to branch a
+        what-if run with its own seed. Cached paths are restored; D* Lite planners and distance
+        fields are rebuilt on first use. The disturbance generator, the demand source (a trip file
+        is reopened and its delivered trips skipped, so it must not have changed) and event
+        scheduling come back as saved; the profiler and step listeners (e.g. a recorder) do not.
+
+        Passenger objects are only built for rows that still take part in the run: when the
+        simulation retires finished passengers, those rows go straight into the archive columns.
+        """
+        header = self.header
+        city_state = header["city"]
+        if rng is None:
+            rng = random.Random()
+            version, internal, gauss = header["rng"]
+            rng.setstate((version, tuple(internal), gauss))
+        city = City(city_state["width"], city_state["height"], [tuple(stop) for stop in city_state["bus_stops"]], rng=rng)
+        city.grid = array("H", self.column("city.grid"))
+        city.blocked_routes = {((sx, sy), (ex, ey)): (duration, counter)
+                               for sx, sy, ex, ey, duration, counter in city_state["blocked_routes"]}
+        city.blocked_version = city_state["blocked_version"]
+
+        buses = []
+        for state in header["buses"]:
+            bus = PublicTransport(state["id"], [tuple(stop) for stop in state["route"]], city, state["routing_strategy"])
+            bus.position = tuple(state["position"])
+            bus.route_index = state["route_index"]
+            bus.path = [tuple(cell) for cell in state["path"]]
+            for name in ("path_step", "path_version", "served_stops", "total_passenger_loads", "routing_calls", "nodes_expanded"):
+                setattr(bus, name, state[name])
+            buses.append(bus)
+
+        archive = {name: array(typecode, self.column(f"archive.{name}")) for name, typecode in ARCHIVE_COLUMNS.items()}
+        columns = [self.column(f"passengers.{name}").tolist() for name in PASSENGER_COLUMNS]
+        rows = zip(*columns)  # Unpacked in PASSENGER_COLUMNS order below
+        if header["simulation"]["retire_interval"] > 0:
+            # Finished passengers would only wait to be archived, so they go there without becoming objects
+            column = dict(zip(PASSENGER_COLUMNS, columns))
+            finished = [complete and on_bus == NONE and riding == NONE for complete, on_bus, riding
+                        in zip(column["journey_complete"], column["on_bus"], column["riding"])]
+            for name in ARCHIVE_COLUMNS:
+                archive[name].extend(itertools.compress(column[name], finished))
+            rows = itertools.compress(rows, [not done for done in finished])
+        passengers = []
+        seats = []
+        new_passenger = Passenger.__new__
+        collecting = gc.isenabled()
+        gc.disable()  # Collections triggered by allocating the rows would find no garbage, only slow the loop
+        try:
+            for (passenger_id, origin_x, origin_y, x, y, dest_x, dest_y, target_x, target_y, waiting_time, max_waiting_time,
+                 journey_complete, ready_to_board, start_time, end_time, on_bus, riding, seat) in rows:
+                passenger = new_passenger(Passenger)
+                passenger.id = passenger_id
+                passenger.origin = (origin_x, origin_y)
+                passenger.current_position = (x, y)
+                passenger.destination = (dest_x, dest_y)
+                passenger.on_bus = buses[on_bus] if on_bus != NONE else None
+                passenger.target_stop = (target_x, target_y) if target_x != NONE else None
+                passenger.waiting_time = waiting_time
+                passenger.max_waiting_time = max_waiting_time
+                passenger.journey_complete = bool(journey_complete)
+                passenger.start_time = start_time if start_time != NONE else None
+                passenger.end_time = end_time if end_time != NONE else None
+                passenger.ready_to_board = bool(ready_to_board)
+                if riding != NONE:
+                    seats.append((riding, seat, passenger))
+                passengers.append(passenger)
+        finally:
+            if collecting:
+                gc.enable()
+        for bus, _, passenger in sorted(seats, key=lambda seat: seat[:2]):
+            buses[bus].passengers[passenger] = None  # Refill each load in boarding order
+
+        simulation = Simulation(city, buses, passengers, passenger_engine=self._restore_engine(), rng=rng)
+        for name, value in header["simulation"].items():
+            setattr(simulation, name, value)
+        simulation.metrics = _restore_metrics(header["metrics"])
+        simulation.archive.columns = archive
+        simulation.disturbances = _restore_disturbances(header["disturbances"], city)
+        simulation.demand = _restore_demand(header["demand"])
+        if header["agenda"] is not None:
+            simulation.enable_event_scheduling().updates = header["agenda"]["updates"]
+        return simulation
+
+    def _restore_engine(self):
+        state = self.header["engine"]
+        if state is None:
+            return None
+        import numpy as np
+        from passenger_engine import PassengerEngine  # Only checkpoints with an engine need NumPy
+
+        engine = PassengerEngine(max(state["size"], 1))
+        engine.size = state["size"]
+        for name in ENGINE_COLUMNS:
+            getattr(engine, name)[:engine.size] = np.frombuffer(self.column(f"engine.{name}"),
+                                                                dtype=getattr(engine, name).dtype)
+        engine._destination_keys = {tuple(stop): key for key, stop in enumerate(state["destinations"])}
+        return engine
+
+
+def loads(data: bytes) -> Checkpoint:
+    """Open a checkpoint held in memory."""
+    return Checkpoint(data)
+
+
+def load(path: str) -> Checkpoint:
+    """Memory-map a checkpoint file; columns are paged in only as a restore reads them."""
+    with open(path, "rb") as checkpoint_file:
+        return Checkpoint(mmap.mmap(checkpoint_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def fork(simulation: Simulation, rng: Optional[random.Random] = None) -> Simulation:
+    """Return an independent copy of a simulation in its current state."""
+    return loads(dumps(simulation)).restore(rng)
@@ -0,0 +1,132 @@
+import csv
+import struct
+from typing import Iterable, Iterator, Optional, Tuple
+
+from route_index import StopBuckets
+
+Position = Tuple[int, int]
+Trip = Tuple[int, Position, Position]  # (step, origin, destination)
+
+CSV_COLUMNS = ["step", "origin_x", "origin_y", "dest_x", "dest_y"]
+MAGIC = b"BUSTRIP1"  # Binary trip file signature and format version
+RECORD = struct.Struct("<iiiii")  # step, origin x, origin y, destination x, destination y
+CHUNK_RECORDS = 65536  # Records read from a binary trip file at a time
+
+
+class RandomDemand:
+    """A new passenger between two random stops with the given chance at each step, like scenario.add_random_passenger."""
+
+    def __init__(self, rate: float = 0.1):
+        self.rate = rate
+
+    def due(self, step: int, simulation) -> Iterator[Tuple[Position, Position]]:
+        rng = simulation.rng
+        if rng.random() < self.rate:
+            yield rng.choice(simulation.city.bus_stops), rng.choice(simulation.city.bus_stops)
+
+
+class TripDemand:
+    """Replay trips, sorted by step, from any iterable; only the next trip is held in memory.
+
+    Each step takes the trips due at or before it. Destinations that no route serves are moved to
+    the nearest stop that one does (a passenger needs a route to their destination), unless snap
+    is off. Pair it with read_csv_trips or read_binary_trips to stream a trip file.
+    """
+
+    def __init__(self, trips: Iterable[Trip], snap: bool = True, path: Optional[str] = None):
+        self.path = path  # Trip file the trips come from, if any; checkpoints reopen it
+        self._trips = iter(trips)
+        self._next: Optional[Trip] = next(self._trips, None)
+        self.snap = snap
+        self.delivered = 0  # Trips handed to the simulation so far
+        self.snapped = 0  # Of those, trips whose destination was moved to a served stop
+        self._served = None  # (route index, StopBuckets of the stops it serves) for snapping
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next is None
+
+    def skip(self, count: int):
+        """Drop the next count trips unseen, e.g. those delivered before a checkpoint was saved."""
+        for _ in range(count):
+            if self._next is None:
+                return
+            self._next = next(self._trips, None)
+            self.delivered += 1
+
+    def due(self, step: int, simulation) -> Iterator[Tuple[Position, Position]]:
+        while self._next is not None and self._next[0] <= step:
+            _, origin, destination = self._next
+            self._next = next(self._trips, None)
+            self.delivered += 1
+            if self.snap and not simulation.route_index.serves(destination):
+                destination = self._nearest_served(simulation.route_index, destination)
+                self.snapped += 1
+            yield origin, destination
+
+    def _nearest_served(self, route_index, position: Position) -> Optional[Position]:
+        if self._served is None or self._served[0] is not route_index:
+            self._served = (route_index, StopBuckets(list(route_index.candidates), 8))
+        return self._served[1].nearest(position)
+
+
+def _check_order(trips: Iterator[Trip], source: str) -> Iterator[Trip]:
+    last = None
+    for trip in trips:
+        if last is not None and trip[0] < last:
+            raise ValueError(f"{source}: trips must be sorted by step (step {trip[0]} after {last})")
+        last = trip[0]
+        yield trip
+
+
+def read_csv_trips(path: str, buffer_size: int = 1 << 20) -> Iterator[Trip]:
+    """Stream trips from a CSV file with a header naming the CSV_COLUMNS (in any order, extra columns ignored)."""
+    def rows():
+        with open(path, newline="", buffering=buffer_size) as trip_file:
+            reader = csv.reader(trip_file)
+            header = next(reader, None)
+            if header is None:
+                return
+            try:
+                step, ox, oy, dx, dy = (header.index(name) for name in CSV_COLUMNS)
+            except ValueError:
+                raise ValueError(f"{path}: the header must name the columns {CSV_COLUMNS}") from None
+            for row in reader:
+                if row:
+                    yield int(row[step]), (int(row[ox]), int(row[oy])), (int(row[dx]), int(row[dy]))
+    return _check_order(rows(), path)
+
+
+def read_binary_trips(path: str, chunk_records: int = CHUNK_RECORDS) -> Iterator[Trip]:
+    """Stream trips from a binary trip file (see write_binary_trips), chunk_records records per read."""
+    def rows():
+        with open(path, "rb") as trip_file:
+            if trip_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path}: not a binary trip file")
+            while True:
+                chunk = trip_file.read(chunk_records * RECORD.size)
+                if not chunk:
+                    return
+                if len(chunk) % RECORD.size:
+                    raise ValueError(f"{path}: truncated trip record")
+                for step, ox, oy, dx, dy in RECORD.iter_unpack(chunk):
+                    yield step, (ox, oy), (dx, dy)
+    return _check_order(rows(), path)
+
+
+def write_binary_trips(path: str, trips: Iterable[Trip]) -> int:
+    """Write trips as packed little-endian records after a signature; return how many were written."""
+    count = 0
+    with open(path, "wb") as trip_file:
+        trip_file.write(MAGIC)
+        for step, origin, destination in trips:
+            trip_file.write(RECORD.pack(step, *origin, *destination))
+            count += 1
+    return count
+
+
+def open_trips(path: str, snap: bool = True) -> TripDemand:
+    """Demand replaying a trip file, binary if it starts with the signature and CSV otherwise."""
+    with open(path, "rb") as trip_file:
+        binary = trip_file.read(len(MAGIC)) == MAGIC
+    return TripDemand(read_binary_trips(path) if binary else read_csv_trips(path), snap, path)
@@ -0,0 +1,144 @@
+from bisect import bisect_right
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import events
+
+DIRECTIONS = [(1, 0), (0, 1), (-1, 0), (0, -1)]  # Blocked routes run horizontally or vertically
+MIN_LENGTH, MAX_LENGTH = 4, 6  # Cells between the two ends of a blocked route
+MAX_TRIES = 16  # Rejected draws before a distribution falls back to a uniform start
+
+
+class FreeCellSampler:
+    """Uniform draws over the cells that are not bus stops, without listing the grid.
+
+    Free cells are numbered column by column (x-major, as the original valid_points list was),
+    so drawing number k takes one random draw and a binary search over the sorted stop cells, and
+    returns the same cell rng.choice(valid_points) would have. is_stop() is a bitset lookup for
+    distributions that sample near a point and reject stops.
+    """
+
+    def __init__(self, width: int, height: int, bus_stops: Sequence[Tuple[int, int]]):
+        self.width = width
+        self.height = height
+        self.stops = len(bus_stops)  # Stop count the sampler was built for
+        self.stop_cells = bytearray(width * height)
+        for x, y in bus_stops:
+            if 0 <= x < width and 0 <= y < height:
+                self.stop_cells[x * height + y] = 1
+        cells = [cell for cell, is_stop in enumerate(self.stop_cells) if is_stop]
+        self.shifted = [cell - rank for rank, cell in enumerate(cells)]  # Free cells numbered below each stop
+        self.count = width * height - len(cells)
+
+    def is_stop(self, position: Tuple[int, int]) -> bool:
+        return bool(self.stop_cells[position[0] * self.height + position[1]])
+
+    def sample(self, rng) -> Tuple[int, int]:
+        """A uniformly random cell that is not a stop."""
+        if not self.count:
+            raise IndexError("every cell is a bus stop")
+        k = rng.randrange(self.count)
+        return divmod(k + bisect_right(self.shifted, k), self.height)
+
+
+class Uniform:
+    """Blockages start anywhere except at a stop, with equal chance."""
+
+    def start(self, city, rng) -> Tuple[int, int]:
+        return city.free_cell_sampler().sample(rng)
+
+
+class Hotspots:
+    """Most blockages start within radius cells of one of the centers (e.g. a busy junction)."""
+
+    def __init__(self, centers: List[Tuple[int, int]], radius: int = 3, share: float = 0.8):
+        self.centers = centers
+        self.radius = radius
+        self.share = share  # Chance that a blockage starts near a hotspot rather than anywhere
+
+    def start(self, city, rng) -> Tuple[int, int]:
+        sampler = city.free_cell_sampler()
+        if rng.random() < self.share:
+            for _ in range(MAX_TRIES):
+                x, y = rng.choice(self.centers)
+                cell = (x + rng.randint(-self.radius, self.radius), y + rng.randint(-self.radius, self.radius))
+                if city.is_valid_position(cell) and not sampler.is_stop(cell):
+                    return cell
+        return sampler.sample(rng)
+
+
+class Corridors:
+    """Most blockages start on one of a few straight corridors (e.g. arterial roads under works)."""
+
+    def __init__(self, corridors: List[Tuple[Tuple[int, int], Tuple[int, int]]], share: float = 0.8):
+        self.corridors = corridors  # Horizontal or vertical segments, both ends included
+        self.share = share  # Chance that a blockage starts on a corridor rather than anywhere
+
+    def start(self, city, rng) -> Tuple[int, int]:
+        sampler = city.free_cell_sampler()
+        if rng.random() < self.share:
+            for _ in range(MAX_TRIES):
+                (x1, y1), (x2, y2) = rng.choice(self.corridors)
+                cell = (rng.randint(min(x1, x2), max(x1, x2)), rng.randint(min(y1, y2), max(y1, y2)))
+                if city.is_valid_position(cell) and not sampler.is_stop(cell):
+                    return cell
+        return sampler.sample(rng)
+
+
+class TimeOfDay:
+    """Disturbance rate that follows a daily profile: period steps make a day, split evenly over the profile."""
+
+    def __init__(self, profile: List[float], period: int):
+        self.profile = profile
+        self.period = period
+
+    def __call__(self, step: int) -> float:
+        return self.profile[step % self.period * len(self.profile) // self.period]
+
+
+def time_of_day(profile: List[float], period: int) -> Callable[[int], float]:
+    """Rate for DisturbanceGenerator that follows a daily profile (see TimeOfDay)."""
+    return TimeOfDay(profile, period)
+
+
+class DisturbanceGenerator:
+    """Draw random blocked routes from a pluggable distribution in constant time.
+
+    distribution picks the start cell (Uniform, Hotspots, Corridors or anything with a start(city, rng)
+    method); the end lies 4 to 6 cells away in a random direction. rate, if given, maps the step to the
+    chance that a disturbance step blocks a route at all, e.g. time_of_day([...], period). With the
+    defaults the draws are exactly those of the original full-grid scan.
+    """
+
+    def __init__(self, city, distribution=None, rate: Optional[Callable[[int], float]] = None, max_blocked: int = 4):
+        self.city = city
+        self.distribution = distribution if distribution is not None else Uniform()
+        self.rate = rate
+        self.max_blocked = max_blocked  # Upper bound of the random cap on routes blocked at once
+
+    def disturb(self, step: int) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Block a route if the rate allows it at this step; return the route blocked, if any."""
+        if self.rate is not None and self.city.rng.random() >= self.rate(step):
+            return None
+        return self.add_blockage()
+
+    def add_blockage(self) -> Optional[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """Block a random route that avoids starting at a stop and spans at least 4 cells."""
+        city = self.city
+        rng = city.rng
+        max_blocked_routes = rng.randint(0, self.max_blocked)  # Random number of blocked routes
+        if len(city.blocked_routes) >= max_blocked_routes:
+            return None
+        start = self.distribution.start(city, rng)
+        candidates = [
+            (start[0] + dx * d, start[1] + dy * d)
+            for dx, dy in DIRECTIONS
+            for d in range(MIN_LENGTH, MAX_LENGTH + 1)
+            if city.is_valid_position((start[0] + dx * d, start[1] + dy * d))
+        ]
+        if not candidates:
+            events.emit(events.DEBUG, "no_blockable_route", "No valid routes to block.")
+            return None
+        end = rng.choice(candidates)
+        city.block_route(start, end)
+        events.emit(events.DEBUG, "disturbance", "Blocked route between {start} and {end}.", start=start, end=end)
+        return start, end
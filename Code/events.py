@@ -0,0 +1,121 @@
+import json
+import sys
+from typing import Dict, List, Optional, TextIO
+
+# Event levels, from per-agent chatter up to the per-step summary
+DEBUG = 10  # Agent movement and state lines printed for every agent on every step
+INFO = 20  # Agent events: boarded, disembarked, blocked, rerouted, ...
+SUMMARY = 30  # The system metrics printed at the end of every step
+QUIET = 100  # Threshold that lets nothing through
+
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", SUMMARY: "SUMMARY"}
+
+step = 0  # Simulation step stamped on recorded events, kept current by Simulation.run_step
+
+
+class ConsoleSink:
+    """Format events with their message template and print them, like the original print() calls."""
+
+    def __init__(self, level: int = DEBUG, stream: Optional[TextIO] = None):
+        self.level = level
+        self.stream = stream
+
+    def write(self, level: int, kind: str, template: str, fields: Dict):
+        print(template.format(**fields), file=self.stream or sys.stdout)
+
+    def close(self):
+        pass
+
+
+class JsonlSink:
+    """Buffer events as JSON lines and write them to a file in batches.
+
+    Only the fields are recorded, never the formatted message, so a full trace costs one
+    json.dumps per event and one file write per buffer_lines events.
+    """
+
+    def __init__(self, path: str, level: int = INFO, buffer_lines: int = 4096):
+        self.level = level
+        self.buffer_lines = buffer_lines
+        self.buffer: List[str] = []
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, level: int, kind: str, template: str, fields: Dict):
+        record = {"step": step, "level": LEVEL_NAMES.get(level, level), "event": kind}
+        for name, value in fields.items():
+            # json rejects non-string dict keys before any fallback runs, so convert those up front
+            record[name] = _jsonable(value) if isinstance(value, dict) else value
+        self.buffer.append(json.dumps(record, default=_jsonable))
+        if len(self.buffer) >= self.buffer_lines:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write("\n".join(self.buffer) + "\n")
+            self.buffer = []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TeeSink:
+    """Send each event to every sink whose level lets it through."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+        self.level = min((sink.level for sink in sinks), default=QUIET)
+
+    def write(self, level: int, kind: str, template: str, fields: Dict):
+        for sink in self.sinks:
+            if level >= sink.level:
+                sink.write(level, kind, template, fields)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def _jsonable(value):
+    """Fallback encoder for field values json cannot encode directly (e.g. dicts keyed by route tuples)."""
+    if isinstance(value, dict):
+        return [[key, item] for key, item in value.items()]
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return repr(value)
+
+
+_sink = ConsoleSink()
+_threshold = _sink.level
+
+
+def set_sink(sink) -> object:
+    """Install the sink that receives all events (None for quiet mode) and return the previous one."""
+    global _sink, _threshold
+    previous = _sink
+    _sink = sink
+    _threshold = sink.level if sink is not None else QUIET
+    return previous
+
+
+def quiet() -> object:
+    """Drop every event without formatting it; returns the previous sink."""
+    return set_sink(None)
+
+
+def enabled(level: int) -> bool:
+    """Check if events at this level reach the sink, to skip building them otherwise."""
+    return level >= _threshold
+
+
+def emit(level: int, kind: str, template: str, **fields):
+    """Record an event; template is only formatted by sinks that print it."""
+    if level >= _threshold:
+        _sink.write(level, kind, template, fields)
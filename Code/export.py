@@ -0,0 +1,208 @@
+import argparse
+import json
+import os
+import shutil
+import struct
+import subprocess
+from array import array
+from multiprocessing import Pool
+from typing import Iterator, List, Tuple
+
+MAGIC = b"BUSREC01"  # Recording signature and format version
+FRAME = struct.Struct("<iiii")  # step, buses, active passengers, blocked routes; then their coordinates
+CHUNK_FRAMES = 50  # Frames a worker renders per task
+
+
+class Recorder:
+    """Append the drawable state of every step to a file, for rendering after the run.
+
+    Each frame holds the bus positions, the positions of passengers still travelling and the
+    blocked routes as packed integers, so a 10,000-step run costs a few bytes per agent per step
+    and the simulation never waits on plotting. Use as a context manager or call close().
+    """
+
+    def __init__(self, simulation, path: str):
+        self.simulation = simulation
+        city = simulation.city
+        self.typecode = "h" if max(city.width, city.height) < 1 << 15 else "i"
+        self.frames = 0
+        self.file = open(path, "wb")
+        header = json.dumps({"width": city.width, "height": city.height, "stops": city.bus_stops,
+                             "typecode": self.typecode}).encode("utf-8")
+        self.file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        self.record(simulation)  # The state before the first recorded step
+        simulation.step_listeners.append(self.record)
+
+    def record(self, simulation):
+        simulation.sync_passengers()
+        buses = array(self.typecode)
+        for bus in simulation.buses:
+            buses.extend(bus.position)
+        passengers = array(self.typecode)
+        for passenger in simulation.passengers:
+            if not passenger.journey_complete:
+                passengers.extend(passenger.current_position)
+        blocked = array(self.typecode)
+        for start, end in simulation.city.blocked_routes:
+            blocked.extend((*start, *end))
+        self.file.write(FRAME.pack(simulation.step_count, len(buses) // 2, len(passengers) // 2, len(blocked) // 4))
+        for column in (buses, passengers, blocked):
+            self.file.write(column.tobytes())
+        self.frames += 1
+
+    def close(self):
+        if self.record in self.simulation.step_listeners:
+            self.simulation.step_listeners.remove(self.record)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+    """A recording opened for reading: the city from the header and an index of frame offsets."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: not a simulation recording")
+        (length,) = struct.unpack("<I", self.file.read(4))
+        self.header = json.loads(self.file.read(length))
+        self.typecode = self.header["typecode"]
+        itemsize = array(self.typecode).itemsize
+        self.offsets = []  # File offset of each frame
+        offset = self.file.tell()
+        size = os.fstat(self.file.fileno()).st_size
+        while offset + FRAME.size <= size:
+            self.file.seek(offset)
+            _, buses, passengers, blocked = FRAME.unpack(self.file.read(FRAME.size))
+            self.offsets.append(offset)
+            offset += FRAME.size + (2 * buses + 2 * passengers + 4 * blocked) * itemsize
+        if offset > size:
+            self.offsets.pop()  # The run stopped while writing the last frame
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def frame(self, index: int) -> Tuple[int, array, array, array]:
+        """(step, bus x/y pairs, passenger x/y pairs, blocked x1/y1/x2/y2 quads) of a frame."""
+        self.file.seek(self.offsets[index])
+        step, buses, passengers, blocked = FRAME.unpack(self.file.read(FRAME.size))
+        columns = []
+        for count in (2 * buses, 2 * passengers, 4 * blocked):
+            column = array(self.typecode)
+            column.frombytes(self.file.read(count * column.itemsize))
+            columns.append(column)
+        return (step, *columns)
+
+    def close(self):
+        self.file.close()
+
+
+def _render_chunk(task) -> List[bytes]:
+    """Worker: draw the given frames of a recording as raw RGB, on one figure whose artists are reused."""
+    path, indices, size, dpi = task
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    recording = Recording(path)
+    header = recording.header
+    fig = Figure(figsize=(size, size), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_xlim(0, header["width"] - 1)
+    ax.set_ylim(0, header["height"] - 1)
+    ax.set_aspect('equal', adjustable='box')
+    ax.grid(True)
+    stops = np.array(header["stops"], dtype=float).reshape(-1, 2)
+    ax.scatter(stops[:, 0], stops[:, 1], color='green', s=100, marker='o')
+    # One artist per kind of thing, updated in place; only they are drawn over the cached background
+    blocked = ax.add_collection(LineCollection([], colors='red', linewidths=2, animated=True))
+    buses = ax.scatter([], [], color='blue', s=150, marker='^', animated=True)
+    passengers = ax.scatter([], [], color='pink', s=150, marker='x', animated=True)
+    title = ax.set_title("", animated=True)
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+
+    frames = []
+    for index in indices:
+        step, bus_xy, passenger_xy, blocked_xy = recording.frame(index)
+        blocked.set_segments(np.frombuffer(blocked_xy, dtype=blocked_xy.typecode).reshape(-1, 2, 2))
+        buses.set_offsets(np.frombuffer(bus_xy, dtype=bus_xy.typecode).reshape(-1, 2))
+        passengers.set_offsets(np.frombuffer(passenger_xy, dtype=passenger_xy.typecode).reshape(-1, 2))
+        title.set_text(f"Simulation Step {step}")
+        canvas.restore_region(background)
+        for artist in (blocked, buses, passengers, title):
+            ax.draw_artist(artist)
+        frames.append(np.asarray(canvas.buffer_rgba())[:, :, :3].tobytes())
+    recording.close()
+    return frames
+
+
+def render_frames(path: str, workers: int = None, every: int = 1, size: float = 6, dpi: int = 100) -> Iterator[bytes]:
+    """Yield every few frames of a recording as raw RGB images, in order, drawn by a pool of processes."""
+    recording = Recording(path)
+    indices = list(range(0, len(recording), every))
+    recording.close()
+    tasks = [(path, indices[start:start + CHUNK_FRAMES], size, dpi) for start in range(0, len(indices), CHUNK_FRAMES)]
+    with Pool(workers) as pool:
+        for frames in pool.imap(_render_chunk, tasks):
+            yield from frames
+
+
+def export_video(path: str, output: str, fps: int = 20, workers: int = None, every: int = 1,
+                 size: float = 6, dpi: int = 100) -> int:
+    """Render a recording to a video (through ffmpeg) or a GIF (through Pillow); return the frames written.
+
+    A GIF keeps every frame in memory until it is written, so use every to thin out long runs,
+    or write a video, which streams frames to ffmpeg as they are drawn.
+    """
+    pixels = int(size * dpi)
+    frames = render_frames(path, workers, every, size, dpi)
+    count = 0
+    if output.lower().endswith(".gif"):
+        from PIL import Image
+
+        images = [Image.frombytes("RGB", (pixels, pixels), frame).quantize(colors=64, method=Image.Quantize.FASTOCTREE) for frame in frames]
+        if images:
+            images[0].save(output, save_all=True, append_images=images[1:], duration=1000 // fps, loop=0)
+        return len(images)
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg is needed to write videos; install it or export a .gif")
+    command = [ffmpeg, "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24",
+               "-s", f"{pixels}x{pixels}", "-r", str(fps), "-i", "-", "-pix_fmt", "yuv420p", output]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as encoder:
+        for frame in frames:
+            encoder.stdin.write(frame)
+            count += 1
+        encoder.stdin.close()
+    if encoder.returncode:
+        raise RuntimeError(f"ffmpeg failed with exit code {encoder.returncode}")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a recorded simulation run (headless.py --record) to a video or GIF.")
+    parser.add_argument("recording", help="file written by headless.py --record")
+    parser.add_argument("output", help="output file; .gif uses Pillow, anything else (.mp4, .webm) uses ffmpeg")
+    parser.add_argument("--fps", type=int, default=20, help="frames per second of the output")
+    parser.add_argument("--workers", type=int, default=None, help="rendering processes (default: one per CPU)")
+    parser.add_argument("--every", type=int, default=1, help="render one step in this many")
+    parser.add_argument("--size", type=float, default=6, help="frame size in inches")
+    parser.add_argument("--dpi", type=int, default=100, help="pixels per inch")
+    args = parser.parse_args()
+
+    count = export_video(args.recording, args.output, args.fps, args.workers, args.every, args.size, args.dpi)
+    print(f"Wrote {count} frames to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
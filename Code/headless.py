@@ -0,0 +1,73 @@
+import argparse
+import random
+import time
+
+import events
+from demand import open_trips
+from export import Recorder
+from model import DISTANCE_FIELD, DSTAR_LITE
+from routing import STRATEGIES
+from scenario import build_simulation, add_random_passenger
+
+
+def run_headless(steps: int, seed: int = 0, routing_strategy: str = "dijkstra", event_driven: bool = False,
+                 trips: str = None, record: str = None):
+    """Run the default scenario as fast as possible without output and return it with its throughput.
+
+    Passengers appear at random unless trips names a trip file to replay (see demand.open_trips).
+    record names a file to save every step to, for export.py to render afterwards.
+    """
+    simulation = build_simulation(routing_strategy, rng=random.Random(seed))
+    if trips is not None:
+        simulation.demand = open_trips(trips)
+    if event_driven:
+        simulation.enable_event_scheduling()
+
+    recorder = Recorder(simulation, record) if record is not None else None
+    previous_sink = events.quiet()
+    agent_updates = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(steps):
+            if simulation.demand is None:
+                add_random_passenger(simulation)
+            simulation.run_step()
+            agent_updates += len(simulation.buses) + len(simulation.passengers)
+    finally:
+        events.set_sink(previous_sink)
+        if recorder is not None:
+            recorder.close()
+    elapsed = time.perf_counter() - start
+
+    throughput = {
+        "steps": steps,
+        "seconds": elapsed,
+        "steps_per_second": steps / elapsed if elapsed else float("inf"),
+        "agent_updates_per_second": agent_updates / elapsed if elapsed else float("inf"),
+    }
+    return simulation, throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the city simulation headless, without any plotting.")
+    parser.add_argument("--steps", type=int, default=1000, help="number of simulation steps to run")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--routing", default="dijkstra", choices=sorted(STRATEGIES) + [DISTANCE_FIELD, DSTAR_LITE],
+                        help="how buses find their way to the next stop")
+    parser.add_argument("--event-driven", action="store_true",
+                        help="update only the passengers with something happening at each step")
+    parser.add_argument("--trips", help="CSV or binary trip file to replay instead of random passengers")
+    parser.add_argument("--record", help="save every step to this file for export.py to render as a video")
+    args = parser.parse_args()
+
+    simulation, throughput = run_headless(args.steps, args.seed, args.routing, args.event_driven, args.trips,
+                                          args.record)
+    print(f"Ran {throughput['steps']} steps in {throughput['seconds']:.3f}s "
+          f"({throughput['steps_per_second']:.1f} steps/sec, "
+          f"{throughput['agent_updates_per_second']:.1f} agent-updates/sec).")
+    events.set_sink(events.ConsoleSink(level=events.SUMMARY))  # Final metrics only, no per-agent lines
+    simulation.print_state()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import math
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class StreamingHistogram:
+    """Histogram of non-negative values with bounded memory.
+
+    Values below linear_limit get one exact bucket each; larger values fall into
+    logarithmic buckets with sub_buckets per doubling, so quantiles stay within a
+    few percent while the bucket count only grows with log(max value).
+    """
+
+    def __init__(self, linear_limit: int = 64, sub_buckets: int = 8):
+        self.linear_limit = linear_limit
+        self.sub_buckets = sub_buckets
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value) -> int:
+        if value < self.linear_limit:
+            return int(value)
+        return self.linear_limit + int(math.log2(value / self.linear_limit) * self.sub_buckets)
+
+    def _bucket_value(self, bucket: int) -> float:
+        """Lower edge of a bucket."""
+        if bucket < self.linear_limit:
+            return bucket
+        return self.linear_limit * 2 ** ((bucket - self.linear_limit) / self.sub_buckets)
+
+    def add(self, value, count: int = 1):
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def add_many(self, values: Iterable):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "StreamingHistogram"):
+        """Add another histogram with the same bucket layout into this one."""
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Approximate the q-quantile from the bucket counts."""
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen > rank:
+                return min(max(self._bucket_value(bucket), self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+        }
+
+
+class MetricsAccumulator:
+    """Running counters and histograms updated as agent events happen, reported in constant time."""
+
+    def __init__(self, grid_size: int):
+        self.grid_size = grid_size
+        self.passengers_transported = 0  # Journeys completed, each counted once
+        self.boardings = 0
+        self.served_stops = 0
+        self.passenger_loads = 0  # Passengers carried, summed over every bus move
+        self.occupied_cells = 0  # Distinct cells holding a bus after the latest step
+        self.travel_time = StreamingHistogram()
+        self.waiting_time = StreamingHistogram()
+        self.bus_load = StreamingHistogram()
+        self.stop_service: Dict[Tuple[int, int], int] = {}  # Stop -> times a bus served it
+        self.stop_reached: Dict[Tuple[int, int], Tuple[int, int]] = {}  # Stop -> (step, bus order) of its latest service
+        self.busiest_stop = None  # First stop to reach the highest count
+
+    def record_bus_move(self, served_stop: Optional[Tuple[int, int]], load: int, sample: bool = True,
+                        order: Tuple[int, int] = (0, 0)):
+        """Count one bus move, the stop it served (if any) and the passengers it carried.
+
+        order is the (step, fleet-wide bus order) of the move; merge() uses it to break ties for the
+        busiest stop the same way. With sample off the load is not added to the bus_load histogram yet, because more riders of
+        the same move are counted elsewhere (a PassengerEngine) and the sample should hold them all.
+        """
+        self.passenger_loads += load
+        if sample:
+            self.bus_load.add(load)
+        if served_stop is not None:
+            self.served_stops += 1
+            count = self.stop_service.get(served_stop, 0) + 1
+            self.stop_service[served_stop] = count
+            self.stop_reached[served_stop] = order
+            if self.busiest_stop is None or count > self.stop_service[self.busiest_stop]:
+                self.busiest_stop = served_stop
+
+    def record_boarding(self, waiting_time: int):
+        self.boardings += 1
+        self.waiting_time.add(waiting_time)
+
+    def record_completion(self, travel_time: Optional[int]):
+        self.passengers_transported += 1
+        if travel_time is not None:
+            self.travel_time.add(travel_time)
+
+    def merge(self, other: "MetricsAccumulator"):
+        """Add the counts of another accumulator, e.g. one per tile of a sharded run (occupied cells add up too)."""
+        for name in ("passengers_transported", "boardings", "served_stops", "passenger_loads", "occupied_cells"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.travel_time.merge(other.travel_time)
+        self.waiting_time.merge(other.waiting_time)
+        self.bus_load.merge(other.bus_load)
+        for stop, count in other.stop_service.items():
+            self.stop_service[stop] = self.stop_service.get(stop, 0) + count
+        for stop, order in other.stop_reached.items():
+            self.stop_reached[stop] = max(order, self.stop_reached.get(stop, order))  # The total was reached last
+        if self.stop_service:
+            # Like record_bus_move: the highest count, and of those the stop that reached it first
+            self.busiest_stop = min(self.stop_service,
+                                    key=lambda stop: (-self.stop_service[stop], self.stop_reached.get(stop, (0, 0))))
+
+    @property
+    def grid_utilization(self) -> float:
+        """Percentage of cells occupied by buses."""
+        return self.occupied_cells / self.grid_size * 100
+
+    def report(self) -> Dict:
+        """Current metrics as plain data; the cost depends on histogram buckets, not on agents."""
+        return {
+            "passengers_transported": self.passengers_transported,
+            "boardings": self.boardings,
+            "served_stops": self.served_stops,
+            "passenger_loads": self.passenger_loads,
+            "grid_utilization": self.grid_utilization,
+            "travel_time": self.travel_time.to_dict(),
+            "waiting_time": self.waiting_time.to_dict(),
+            "bus_load": self.bus_load.to_dict(),
+            "busiest_stop": self.busiest_stop,
+            "busiest_stop_services": self.stop_service.get(self.busiest_stop, 0),
+        }
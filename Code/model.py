@@ -1,17 +1,59 @@
-import heapq
-from typing import List, Tuple
+from array import array
+from typing import List, Optional, Tuple
+import itertools
 import random
+import time
+
+import events
+import routing
+from agenda import PassengerAgenda
+from archive import PassengerArchive
+from disturbances import DisturbanceGenerator, FreeCellSampler
+from metrics import MetricsAccumulator
+from profiling import StepProfiler
+from route_index import RouteIndex
+
+DISTANCE_FIELD = "distance_field"  # Routing strategy that follows the city's per-stop distance fields
+DSTAR_LITE = "dstar_lite"  # Routing strategy that repairs a per-bus D* Lite search as blockages change
+
+
 class City:
-    def __init__(self, width: int, height: int, bus_stops: List[Tuple[int, int]]):
+    def __init__(self, width: int, height: int, bus_stops: List[Tuple[int, int]], rng=None):
         self.width = width
         self.height = height
         self.bus_stops = bus_stops
+        self.rng = rng if rng is not None else random  # Source of randomness; the global random module unless isolated
         self.blocked_routes = {}  # Store blocked routes as a dictionary with (start, end) -> (block_duration, counter)
+        self.blocked_version = 0  # Bumped whenever blocked_routes changes so planned paths can be revalidated
+        # Occupancy grid padded with a one-cell wall so bounds and blockages share a single lookup.
+        # Each entry counts the blocked routes covering the cell; 0 means the cell is passable.
+        self.stride = width + 2
+        self.grid = array('H', [routing.WALL]) * (self.stride * (height + 2))
+        for y in range(height):
+            row = self.cell_index((0, y))
+            self.grid[row:row + width] = array('H', [0]) * width
+        self.distance_fields = {}  # Goal grid index -> routing.distance_field, shared by every bus heading there
+        self.blockage_listeners = []  # Callables notified with (blocked, freed) grid indices on every change
+        self.free_cells = None  # disturbances.FreeCellSampler over the non-stop cells, built on first use
+        self.profiler = None  # profiling.StepProfiler set by the simulation; distance field builds and repairs report to it
     def is_valid_position(self, position: Tuple[int, int]) -> bool:
         """Check if the position is within the bounds of the city."""
         x, y = position
         return 0 <= x < self.width and 0 <= y < self.height
 
+    def cell_index(self, position: Tuple[int, int]) -> int:
+        """Return the index of an in-bounds position in the occupancy grid."""
+        return (position[1] + 1) * self.stride + position[0] + 1
+
+    def cell_position(self, index: int) -> Tuple[int, int]:
+        """Return the position of an occupancy grid index."""
+        y, x = divmod(index, self.stride)
+        return (x - 1, y - 1)
+
+    def is_passable(self, position: Tuple[int, int]) -> bool:
+        """Check if the position is inside the city and not covered by a blocked route."""
+        return self.is_valid_position(position) and self.grid[self.cell_index(position)] == 0
+
     def is_route_blocked(self, start: Tuple[int, int], end: Tuple[int, int]) -> bool:
         """Check if the route is blocked."""
         if (start, end) in self.blocked_routes:
@@ -25,15 +67,21 @@ class City:
 
     def block_route(self, start: Tuple[int, int], end: Tuple[int, int]):
         """Block a route between two points with a random block duration."""
-        block_duration = random.randint(2, 8)  # Block for a random number of steps between 2 and 8
+        block_duration = self.rng.randint(2, 8)  # Block for a random number of steps between 2 and 8
+        if (start, end) not in self.blocked_routes:
+            self.cells_changed(blocked=self._adjust_route_cells(start, end, 1))
         self.blocked_routes[(start, end)] = (block_duration, 0)  # Initialize counter at 0
-        print(f"Blocked route between {start} and {end} for {block_duration} steps.")
+        self.blocked_version += 1
+        events.emit(events.INFO, "blocked", "Blocked route between {start} and {end} for {duration} steps.",
+                    start=start, end=end, duration=block_duration)
 
     def unblock_route(self, start: Tuple[int, int], end: Tuple[int, int]):
         """Unblock a route between two points."""
         if (start, end) in self.blocked_routes:
             del self.blocked_routes[(start, end)]
-            print(f"Unblocked route between {start} and {end}.")
+            self.cells_changed(freed=self._adjust_route_cells(start, end, -1))
+            self.blocked_version += 1
+            events.emit(events.INFO, "unblocked", "Unblocked route between {start} and {end}.", start=start, end=end)
     
     def update_blocked_routes(self):
         """Increment the counter for each blocked route and unblock if necessary."""
@@ -43,76 +91,140 @@ class City:
                 to_unblock.append((start, end))
             else:
                 self.blocked_routes[(start, end)] = (duration, counter + 1)
+        if self.blocked_routes:
+            self.blocked_version += 1
         
         # Unblock routes after they have been blocked for enough time
         for start, end in to_unblock:
             self.unblock_route(start, end)
 
+    def sync_blocked_routes(self, blocked_routes: dict, blocked_version: int):
+        """Make this city's blockages match another copy of it, e.g. the coordinator's in a sharded run."""
+        for start, end in list(self.blocked_routes):
+            if (start, end) not in blocked_routes:
+                del self.blocked_routes[(start, end)]
+                self.cells_changed(freed=self._adjust_route_cells(start, end, -1))
+        for start, end in blocked_routes:
+            if (start, end) not in self.blocked_routes:
+                self.cells_changed(blocked=self._adjust_route_cells(start, end, 1))
+        self.blocked_routes = dict(blocked_routes)
+        self.blocked_version = blocked_version
+
+    def _adjust_route_cells(self, start: Tuple[int, int], end: Tuple[int, int], delta: int) -> List[int]:
+        """Add delta to the occupancy of every cell on a route and return the cells whose passability flipped."""
+        flipped = []
+        for cell in route_cells(start, end):
+            if self.is_valid_position(cell):
+                index = self.cell_index(cell)
+                before = self.grid[index]
+                self.grid[index] = before + delta
+                if not before or not self.grid[index]:
+                    flipped.append(index)
+        return flipped
+
+    def cells_changed(self, blocked: List[int] = (), freed: List[int] = ()):
+        """Propagate cells that became blocked or passable to the distance fields and blockage listeners."""
+        self.update_distance_fields(blocked, freed)
+        for listener in self.blockage_listeners:
+            listener(blocked, freed)
+
+    def free_cell_sampler(self) -> FreeCellSampler:
+        """Return the sampler of cells that are not stops, rebuilding it if stops were added."""
+        if self.free_cells is None or self.free_cells.stops != len(self.bus_stops):
+            self.free_cells = FreeCellSampler(self.width, self.height, self.bus_stops)
+        return self.free_cells
+
+    def distance_field(self, stop: Tuple[int, int]) -> array:
+        """Return the shared distance field towards a stop, building it on first use."""
+        goal = self.cell_index(stop)
+        if goal not in self.distance_fields:
+            if self.profiler is not None:
+                started = time.perf_counter()
+            field = self.distance_fields[goal] = routing.distance_field(goal, self)
+            if self.profiler is not None:  # Every reachable cell was expanded once
+                self.profiler.record_routing(None, DISTANCE_FIELD, len(field) - field.count(routing.UNREACHABLE), None,
+                                             time.perf_counter() - started)
+        return self.distance_fields[goal]
+
+    def update_distance_fields(self, blocked: List[int] = (), freed: List[int] = ()):
+        """Repair only the distance fields that a change in blocked cells actually touches."""
+        offsets = (-1, 1, -self.stride, self.stride)
+        for goal, field in self.distance_fields.items():
+            # A newly blocked cell matters if the field could reach it; a freed one if it borders a reachable cell
+            touched = any(field[cell] != routing.UNREACHABLE for cell in blocked) or any(
+                cell == goal or any(field[cell + offset] != routing.UNREACHABLE for offset in offsets)
+                for cell in freed
+            )
+            if touched:
+                if self.profiler is not None:
+                    started = time.perf_counter()
+                changed = routing.repair_distance_field(field, goal, self, blocked, freed)
+                if self.profiler is not None:
+                    self.profiler.record_routing(None, DISTANCE_FIELD, changed, None, time.perf_counter() - started)
+
+    def next_step_towards(self, position: Tuple[int, int], stop: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Return the neighboring cell closest to the stop according to its distance field, or None if unreachable."""
+        field = self.distance_field(stop)
+        current = self.cell_index(position)
+        best = None
+        best_dist = routing.UNREACHABLE
+        for offset in (-1, 1, -self.stride, self.stride):
+            neighbor = current + offset
+            if not self.grid[neighbor] and field[neighbor] < best_dist:
+                best = neighbor
+                best_dist = field[neighbor]
+        return self.cell_position(best) if best is not None else None
+
+
+def route_cells(start: Tuple[int, int], end: Tuple[int, int]) -> List[Tuple[int, int]]:
+    """List every cell along a blocked route, including both endpoints."""
+    x1, y1 = start
+    x2, y2 = end
+
+    # Get the direction of movement (either horizontal or vertical)
+    dx = 1 if x2 > x1 else -1 if x2 < x1 else 0
+    dy = 1 if y2 > y1 else -1 if y2 < y1 else 0
+
+    cells = []
+    current = start
+    while current != end:
+        cells.append(current)
+        current = (current[0] + dx, current[1] + dy)
+    cells.append(end)  # Add the endpoint as well
+    return cells
+
 
 def dijkstra(start: Tuple[int, int], goal: Tuple[int, int], city: City) -> List[Tuple[int, int]]:
     """Find the shortest path using Dijkstra's algorithm, avoiding blocked routes if they exist."""
-    pq = []
-    heapq.heappush(pq, (0, start))  # Distance to the start is 0
-    distances = {start: 0}
-    predecessors = {start: None}
-
-    directions = [(-1, 0), (1, 0), (0, -1), (0, 1)]  # Up, Down, Left, Right
-
-    # A set of all blocked points (including intermediate points along blocked routes)
-    blocked_points = set()
-    for start, end in city.blocked_routes:
-        x1, y1 = start
-        x2, y2 = end
-
-        # Get the direction of movement (either horizontal or vertical)
-        dx = 1 if x2 > x1 else -1 if x2 < x1 else 0
-        dy = 1 if y2 > y1 else -1 if y2 < y1 else 0
-
-        current = start
-        while current != end:
-            blocked_points.add(current)
-            current = (current[0] + dx, current[1] + dy)
-        blocked_points.add(end)  # Add the endpoint as well
-
-    while pq:
-        current_dist, current = heapq.heappop(pq)
-
-        if current == goal:
-            # Reconstruct the path from start to goal
-            path = []
-            while current is not None:
-                path.append(current)
-                current = predecessors[current]
-            return path[::-1]  # Reverse to get start -> goal path
-
-        for dx, dy in directions:
-            neighbor = (current[0] + dx, current[1] + dy)
-
-            if not city.is_valid_position(neighbor) or neighbor in blocked_points:
-                # Skip invalid positions or blocked positions
-                continue
-
-            tentative_dist = current_dist + 1
-            if neighbor not in distances or tentative_dist < distances[neighbor]:
-                distances[neighbor] = tentative_dist
-                predecessors[neighbor] = current
-                heapq.heappush(pq, (tentative_dist, neighbor))
-
-    return []  # No path found
+    return routing.search(start, goal, city, "dijkstra").path
 
 
 class PublicTransport:
-    def __init__(self, id, route, city):
+    __slots__ = ("id", "route", "city", "routing_strategy", "position", "route_index", "passengers", "path", "path_step",
+                 "path_version", "served_stops", "total_passenger_loads", "timings", "routing_calls", "nodes_expanded",
+                 "profiler", "planner", "changed_cells")
+
+    def __init__(self, id, route, city, routing_strategy: str = "dijkstra"):
         self.id = id
         self.route = route
         self.city = city
+        self.routing_strategy = routing_strategy  # A search in routing.STRATEGIES, DISTANCE_FIELD or DSTAR_LITE
         self.position = route[0]  # Start at the first stop
         self.route_index = 0
-        self.passengers = []
-        self.path = []
+        self.passengers = {}  # Passengers on board; an insertion-ordered dict used as a set for O(1) membership and removal
+        self.path = []  # Planned path towards the current target stop
+        self.path_step = 0  # Index of the current position within self.path
+        self.path_version = -1  # City.blocked_version the planned path was last validated against
         self.served_stops = 0  # Track how many stops the bus has served
         self.total_passenger_loads = 0  # Track the number of passengers boarded and dropped off
         self.timings = []  # Track the time taken to complete each cycle
+        self.routing_calls = 0  # Number of path searches this bus has run
+        self.nodes_expanded = 0  # Total nodes expanded by those searches
+        self.profiler = None  # profiling.StepProfiler set by the simulation while profiling is enabled
+        self.planner = None  # routing.DStarLite towards the current target stop when replanning incrementally
+        self.changed_cells = []  # Grid indices whose passability changed since the planner last ran
+        if routing_strategy == DSTAR_LITE:
+            city.blockage_listeners.append(self.on_cells_changed)
 
     def move(self):
         target_stop = self.route[self.route_index]
@@ -122,35 +234,107 @@ class PublicTransport:
             self.route_index = (self.route_index + 1) % len(self.route)
             target_stop = self.route[self.route_index]
             self.served_stops += 1  # Increment served stop count
-        
-        # Calculate the path using Dijkstra
-        path = dijkstra(self.position, target_stop, self.city)
-        
-        if path and len(path) > 1:
+
+        next_position = self.next_position(target_stop)
+
+        if next_position is not None:
             # Move to the next position on the path
-            self.position = path[1]
+            self.position = next_position
         else:
-            print(f"Bus {self.id} cannot move to {target_stop}. No valid path found due to blocked routes.")
+            events.emit(events.INFO, "no_path", "Bus {bus} cannot move to {target}. No valid path found due to blocked routes.",
+                        bus=self.id, target=target_stop)
             if self.route_index > 0:
                 previous_stop = self.route[self.route_index - 1]
             else:
                 previous_stop = self.route[-1]
             
-            print(f"Bus {self.id} is going back to the previous stop {previous_stop}.")
+            events.emit(events.INFO, "rerouted", "Bus {bus} is going back to the previous stop {stop}.",
+                        bus=self.id, stop=previous_stop)
             self.position = previous_stop
             self.route_index = (self.route_index - 1) % len(self.route)  # Go back in the route
+            self.path = []
         
         # Track the passengers
         self.total_passenger_loads += len(self.passengers)  # Count passengers being transported
 
+    def next_position(self, target_stop: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Return the next cell towards the target stop, or None if it cannot be reached."""
+        if self.routing_strategy == DISTANCE_FIELD:
+            return self.city.next_step_towards(self.position, target_stop)
+        if self.routing_strategy == DSTAR_LITE:
+            return self.replan(target_stop)
+
+        # Recalculate the path only when the planned one can no longer be followed
+        if not self.has_valid_path(target_stop):
+            if self.profiler is not None:
+                started = time.perf_counter()
+            result = routing.search(self.position, target_stop, self.city, self.routing_strategy)
+            if self.profiler is not None:
+                self.profiler.record_routing(self.id, self.routing_strategy, result.expanded, len(result.path),
+                                             time.perf_counter() - started)
+            self.routing_calls += 1
+            self.nodes_expanded += result.expanded
+            self.path = result.path
+            self.path_step = 0
+            self.path_version = self.city.blocked_version
+
+        if len(self.path) > self.path_step + 1:
+            self.path_step += 1
+            return self.path[self.path_step]
+        return None
+
+    def replan(self, target_stop: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Advance the D* Lite planner, repairing only what changed since the last step."""
+        if self.planner is None or self.planner.goal != self.city.cell_index(target_stop):
+            self.planner = routing.DStarLite(self.position, target_stop, self.city)
+            self.routing_calls += 1
+            self.changed_cells = []
+        expanded = self.planner.expanded
+        if self.profiler is not None:
+            started = time.perf_counter()
+        next_position = self.planner.next_position(self.position, self.changed_cells)
+        if self.profiler is not None:
+            self.profiler.record_routing(self.id, DSTAR_LITE, self.planner.expanded - expanded, None,
+                                         time.perf_counter() - started)
+        self.nodes_expanded += self.planner.expanded - expanded
+        self.changed_cells = []
+        return next_position
+
+    def on_cells_changed(self, blocked: List[int], freed: List[int]):
+        """Remember blockage changes so the planner can repair them on the next move."""
+        if self.planner is not None:
+            self.changed_cells.extend(blocked)
+            self.changed_cells.extend(freed)
+
+    def has_valid_path(self, target_stop: Tuple[int, int]) -> bool:
+        """Check if the planned path still leads from the current position to the target stop."""
+        if not self.path or self.path[-1] != target_stop or self.path[self.path_step] != self.position:
+            return False
+        if self.path_version != self.city.blocked_version:
+            # Blockages changed since the path was planned; only replan if one lies ahead of the bus
+            city = self.city
+            for index in range(self.path_step + 1, len(self.path)):
+                if city.grid[city.cell_index(self.path[index])]:
+                    return False
+            self.path_version = self.city.blocked_version
+        return True
+
     def board_passenger(self, passenger):
         """Board a passenger onto the bus."""
-        self.passengers.append(passenger)
+        self.passengers[passenger] = None
         passenger.on_bus = self
 
+    def remove_passenger(self, passenger):
+        """Drop a passenger from the bus load."""
+        self.passengers.pop(passenger, None)
+
 class Passenger:
+    __slots__ = ("id", "origin", "current_position", "destination", "on_bus", "target_stop", "waiting_time",
+                 "max_waiting_time", "journey_complete", "start_time", "end_time", "ready_to_board")
+
     def __init__(self, id: int, current_position: Tuple[int, int], destination: Tuple[int, int]):
         self.id = id
+        self.origin = current_position  # Where the journey began
         self.current_position = current_position
         self.destination = destination
         self.on_bus = None
@@ -160,14 +344,18 @@ class Passenger:
         self.journey_complete = False  # Track if the passenger's journey is complete
         self.start_time = None  # Track when the passenger starts their journey
         self.end_time = None  # Track when the passenger reaches their destination
+        self.ready_to_board = False  # Waited at a stop during the last update and may board a bus there
 
-    def find_nearest_stop(self, bus_routes: List[List[Tuple[int, int]]]):
+    def find_nearest_stop(self, bus_routes: List[List[Tuple[int, int]]] = (), route_index: Optional[RouteIndex] = None):
         """Find the nearest bus stop that helps reach the destination."""
         if self.journey_complete:
             return  # If the journey is complete, do nothing
 
         min_distance = float('inf')
         nearest_stop = None
+        if route_index is not None:
+            nearest_stop = route_index.nearest_stop(self.current_position, self.destination)
+            bus_routes = ()  # The index already answered the query
         for route in bus_routes:
             # Check if the route leads to the destination
             if self.destination in route:
@@ -182,19 +370,22 @@ class Passenger:
 
         self.target_stop = nearest_stop  # Set the nearest stop as the target stop
         if nearest_stop:
-            print(f"Passenger {self.id} is moving towards the nearest stop at {nearest_stop}.")
+            events.emit(events.DEBUG, "target_stop", "Passenger {passenger} is moving towards the nearest stop at {stop}.",
+                        passenger=self.id, stop=nearest_stop)
         else:
-            print(f"No suitable bus stop found for Passenger {self.id} to reach the destination.")
+            events.emit(events.INFO, "no_stop", "No suitable bus stop found for Passenger {passenger} to reach the destination.",
+                        passenger=self.id)
 
     def get_off_bus(self):
         """Allow passenger to get off the bus."""
         if self.on_bus:
-            print(f"Passenger {self.id} is getting off the bus at {self.on_bus.position}.")
-            self.on_bus.passengers.remove(self)
+            events.emit(events.INFO, "got_off", "Passenger {passenger} is getting off the bus at {position}.",
+                        passenger=self.id, bus=self.on_bus.id, position=self.on_bus.position)
+            self.on_bus.remove_passenger(self)
             self.on_bus = None
             self.journey_complete = False  # The passenger is still in the journey
         else:
-            print(f"Passenger {self.id} is not on any bus.")
+            events.emit(events.DEBUG, "not_on_bus", "Passenger {passenger} is not on any bus.", passenger=self.id)
 
     def move_towards(self, target: Tuple[int, int]):
         """Move one step closer to the target position (nearest bus stop)."""
@@ -216,12 +407,16 @@ class Passenger:
         # Update position only if it's moving towards the target
         if (new_x, new_y) != self.current_position:
             self.current_position = (new_x, new_y)
-            print(f"Passenger {self.id} is moving towards {self.target_stop}.")
+            events.emit(events.DEBUG, "walking", "Passenger {passenger} is moving towards {stop}.",
+                        passenger=self.id, stop=self.target_stop)
         else:
-            print(f"Passenger {self.id} reached their target stop at {self.current_position}.")
+            events.emit(events.DEBUG, "reached_stop", "Passenger {passenger} reached their target stop at {position}.",
+                        passenger=self.id, position=self.current_position)
 
-    def update(self, buses: List[PublicTransport], step_count: int):
+    def update(self, buses: List[PublicTransport], step_count: int, board: bool = True,
+               route_index: Optional[RouteIndex] = None):
         """Update passenger state, either moving towards a stop or staying on a bus."""
+        self.ready_to_board = False
         if self.journey_complete:
             return  # If the journey is complete, do nothing
 
@@ -233,64 +428,87 @@ class Passenger:
             if self.current_position == self.destination:
                 if self.end_time is None:  # Record end time when reaching destination
                     self.end_time = step_count
-                print(f"Passenger {self.id} disembarked at {self.destination}.")
-                self.on_bus.passengers.remove(self)
+                events.emit(events.INFO, "disembarked", "Passenger {passenger} disembarked at {destination}.",
+                            passenger=self.id, bus=self.on_bus.id, destination=self.destination)
+                self.on_bus.remove_passenger(self)
                 self.on_bus = None
                 self.journey_complete = True  # Mark the journey as complete
             else:
                 # Check if the bus is not going to the passenger's destination
                 if self.destination not in self.on_bus.route:
-                    print(f"Passenger {self.id} is on the wrong bus at {self.current_position}.")
+                    events.emit(events.INFO, "wrong_bus", "Passenger {passenger} is on the wrong bus at {position}.",
+                                passenger=self.id, bus=self.on_bus.id, position=self.current_position)
                     # Get off at the next stop on the route and look for the next bus stop closer to the destination
                     next_stop = self.on_bus.next_stop(self.current_position)
                     self.current_position = next_stop
-                    print(f"Passenger {self.id} got off at {next_stop}.")
-                    self.on_bus.passengers.remove(self)
+                    events.emit(events.INFO, "got_off", "Passenger {passenger} got off at {position}.",
+                                passenger=self.id, bus=self.on_bus.id, position=next_stop)
+                    self.on_bus.remove_passenger(self)
                     self.on_bus = None
 
                     # Find the next bus stop to board the right bus
-                    self.find_nearest_stop([bus.route for bus in buses])
+                    self.retarget(buses, route_index)
                     self.waiting_time = 0  # Reset the waiting time
 
         else:
             if not self.target_stop:
                 # If target stop is not set, find the nearest stop
-                self.find_nearest_stop([bus.route for bus in buses])
+                self.retarget(buses, route_index)
 
             if self.current_position != self.target_stop:
                 # Move towards the target bus stop
                 self.move_towards(self.target_stop)
             else:
-                print(f"Passenger {self.id} reached the bus stop at {self.current_position} and is waiting.")
+                events.emit(events.DEBUG, "waiting", "Passenger {passenger} reached the bus stop at {position} and is waiting.",
+                            passenger=self.id, position=self.current_position)
                 
                 # Increment the waiting time
                 self.waiting_time += 1
 
                 # Check if the passenger has been waiting for too long
                 if self.waiting_time > self.max_waiting_time:
-                    print(f"Passenger {self.id} has been waiting for too long at {self.current_position}. They are considering moving to another stop.")
+                    events.emit(events.INFO, "gave_up",
+                                "Passenger {passenger} has been waiting for too long at {position}. They are considering moving to another stop.",
+                                passenger=self.id, position=self.current_position)
                     
                     # Optionally: Start moving towards another stop (or do some other behavior)
-                    self.find_nearest_stop([bus.route for bus in buses])  # Update target stop (this can be more advanced)
+                    self.retarget(buses, route_index)  # Update target stop (this can be more advanced)
 
                     # Reset waiting time
                     self.waiting_time = 0
 
                 # Try to board a bus, only if the passenger is at a bus stop
-                for bus in buses:
-                    if self.current_position == bus.position and self not in bus.passengers:
-                        if self.destination in bus.route:
-                            bus.board_passenger(self)
-                            print(f"Passenger {self.id} boarded Bus {bus.id} at stop {bus.position}.")
-                            # Set the start time when the passenger boards the bus
-                            if self.start_time is None:
-                                self.start_time = step_count  # Use step_count directly
-                            break
+                if board:
+                    self.try_board(buses, step_count)
+                else:
+                    self.ready_to_board = True  # The simulation boards waiting passengers stop by stop
         
         # Prevent passenger from moving after reaching destination
         if self.current_position == self.destination:
-            print(f"Passenger {self.id} has reached their destination {self.destination} and is no longer moving.")
+            events.emit(events.DEBUG, "arrived", "Passenger {passenger} has reached their destination {destination} and is no longer moving.",
+                        passenger=self.id, destination=self.destination)
             self.journey_complete = True
+    def retarget(self, buses: List[PublicTransport], route_index: Optional[RouteIndex]):
+        """Find the nearest stop through the route index when one is available, else by scanning the bus routes."""
+        if route_index is not None:
+            self.find_nearest_stop(route_index=route_index)
+        else:
+            self.find_nearest_stop([bus.route for bus in buses])
+
+    def try_board(self, buses: List[PublicTransport], step_count: int) -> bool:
+        """Board the first of the given buses at the passenger's position that goes to their destination."""
+        for bus in buses:
+            if self.current_position == bus.position and self not in bus.passengers:
+                if self.destination in bus.route:
+                    bus.board_passenger(self)
+                    events.emit(events.INFO, "boarded", "Passenger {passenger} boarded Bus {bus} at stop {position}.",
+                                passenger=self.id, bus=bus.id, position=bus.position)
+                    # Set the start time when the passenger boards the bus
+                    if self.start_time is None:
+                        self.start_time = step_count  # Use step_count directly
+                    return True
+        return False
+
     def get_travel_time(self):
         """Calculate the time taken for the passenger to complete their journey."""
         if self.start_time is not None and self.end_time is not None:
@@ -302,132 +520,266 @@ class Passenger:
             for start, end in blocked_routes:
                 # Check if the bus is on a blocked route
                 if self.on_bus.position == start or self.on_bus.position == end:
-                    print(f"Passenger {self.id} is on a bus with a blocked route!")
+                    events.emit(events.INFO, "route_blocked", "Passenger {passenger} is on a bus with a blocked route!",
+                                passenger=self.id, bus=self.on_bus.id)
                     self.get_off_bus()  # Passenger could get off or take other action
                     break
 
 def add_random_blocked_route(city: City):
     """Randomly block a route in the city, ensuring it avoids stops and spans at least 4 cells."""
-    max_blocked_routes = random.randint(0,4)  # Random number of blocked routes, less than 5
-    if len(city.blocked_routes) >= max_blocked_routes:
-        return
-    # Generate potential start and end points for blocking
-    valid_points = [
-        (x, y) for x in range(city.width) for y in range(city.height)
-        if (x, y) not in city.bus_stops  # Avoid bus stops
-    ]
-
-    # Randomly choose a start point
-    start = random.choice(valid_points)
-    directions = [(1, 0), (0, 1), (-1, 0), (0, -1)]  # Horizontal/Vertical directions
-
-    # Generate potential end points ensuring a minimum distance of 4 cells
-    candidates = [
-        (start[0] + dx * d, start[1] + dy * d)
-        for dx, dy in directions
-        for d in range(4, 7)  # Minimum distance of 4
-        if city.is_valid_position((start[0] + dx * d, start[1] + dy * d))
-    ]
-
-    if not candidates:
-        print("No valid routes to block.")
-        return
-
-    # Randomly choose an end point from valid candidates
-    end = random.choice(candidates)
-    city.block_route(start, end)
-    print(f"Blocked route between {start} and {end}.")
+    return DisturbanceGenerator(city).add_blockage()
 
 
 class Simulation:
-    def __init__(self, city, buses, passengers):
+    def __init__(self, city, buses, passengers, passenger_engine=None, rng=None):
         self.city = city
+        if rng is not None:
+            city.rng = rng  # The city draws its blockages from the simulation's generator
+        self.rng = city.rng
         self.buses = buses
         self.passengers = passengers
+        self.passenger_engine = passenger_engine  # Optional passenger_engine.PassengerEngine updated in bulk each step
         self.step_count = 0
         self.unblock_counter = 0  # Variable to track steps until unblocking
         self.total_passenger_transport = 0  # Track number of passengers transported
+        self.metrics = MetricsAccumulator(city.width * city.height)  # Running counters, updated as agents act
+        self.blockage_interval = 5  # Steps between random disturbances
+        self.disturbances = DisturbanceGenerator(city)  # Where and how often blockages appear; swap for another distribution
+        self.profiler = None  # profiling.StepProfiler while profiling is enabled
+        self.buses_at = {}  # Cell -> buses currently there, rebuilt after the buses move
+        self.carried = []  # Riders each bus carried during its latest move, in bus order
+        self.bus_seq = None  # Bus -> fleet-wide order when this simulation holds only some of the fleet (a sharded tile)
+        self.waiting_at = {}  # Stop -> passengers who waited there this step and may board
+        self.route_index = RouteIndex([bus.route for bus in buses])  # Destination -> boarding stops, rebuilt when routes change
+        self.step_listeners = []  # Callables notified with the simulation after every step
+        self.agenda = None  # agenda.PassengerAgenda while only passengers with an event are updated
+        self.archive = PassengerArchive()  # Finished journeys retired from self.passengers
+        self.retire_interval = 0  # Steps between moving finished passengers to the archive; 0 keeps them all
+        self.demand = None  # Demand source (demand.RandomDemand, demand.TripDemand) asked for new passengers each step
 
     def run_step(self):
+        profiler = self.profiler
+        if profiler is not None:
+            lap = profiler.start_tick(self.step_count + 1)
         self.step_count += 1
+        events.step = self.step_count
+        self.refresh_route_index()
+        if self.demand is not None:
+            self.add_demand()
+        if profiler is not None:
+            lap = profiler.lap("demand", lap)  # Route index refresh and new passengers
         self.unblock_counter += 1  # Increment unblock counter with each step
 
-        # Add a disturbance every 5 steps, but ensure fewer than 5 blocked routes
-        if self.step_count % 5 == 0:
-            add_random_blocked_route(self.city)
+        self.add_disturbance()
+        if profiler is not None:
+            lap = profiler.lap("disturbance", lap)
+        self.fix_routes()
+        if profiler is not None:
+            lap = profiler.lap("route_fix", lap)
+        self.move_buses()
+        if profiler is not None:
+            lap = profiler.lap("buses", lap)
+        if self.agenda is not None:
+            self.agenda.update(self.step_count)
+        else:
+            self.update_passengers()
+        if profiler is not None:
+            lap = profiler.lap("passengers", lap)
+        self.board_waiting_passengers()
+        if self.agenda is not None:
+            self.agenda.schedule(self.step_count)
+        if self.passenger_engine is not None:
+            self.total_passenger_transport += self.passenger_engine.update(self.buses, self.step_count,
+                                                                           self.city.blocked_routes, self.metrics,
+                                                                           self.carried)
+        if profiler is not None:
+            lap = profiler.lap("boarding", lap)
 
-        random_fixed = random.randint(25, 40)
+        self.print_state()
+        for listener in self.step_listeners:
+            listener(self)
+        if self.retire_interval and self.step_count % self.retire_interval == 0:
+            self.retire_completed()
+        if profiler is not None:
+            profiler.lap("output", lap)
+            profiler.end_tick()
+
+    @property
+    def passenger_count(self) -> int:
+        """Passengers ever added, retired ones included."""
+        return len(self.archive) + len(self.passengers)
+
+    def retire_completed(self) -> int:
+        """Move finished passengers from the passenger list to the archive and return how many moved."""
+        kept = []
+        for passenger in self.passengers:
+            if passenger.journey_complete and passenger.on_bus is None:  # A finished rider still aboard may get off again
+                self.archive.add(passenger)
+                if self.agenda is not None:
+                    self.agenda.retire(passenger)
+            else:
+                kept.append(passenger)
+        retired = len(self.passengers) - len(kept)
+        self.passengers[:] = kept
+        return retired
+
+    def add_demand(self):
+        """Add the passengers the demand source has due at this step."""
+        for origin, destination in self.demand.due(self.step_count, self):
+            if destination is not None:  # No route serves anywhere near it
+                self.passengers.append(Passenger(self.passenger_count + 1, origin, destination))
+
+    def add_disturbance(self):
+        """Add a disturbance every few steps, but ensure fewer than 5 blocked routes."""
+        if self.step_count % self.blockage_interval == 0:
+            self.disturbances.disturb(self.step_count)
+
+    def fix_routes(self):
+        """Every so often, clear all blocked routes."""
+        random_fixed = self.rng.randint(25, 40)
       
         if self.step_count % random_fixed == 0:
-            print(f"Routes fixed at step {self.step_count}.")
+            events.emit(events.INFO, "routes_fixed", "Routes fixed at step {step}.", step=self.step_count)
             self.city.update_blocked_routes()  # Unblock routes that have expired based on their duration
             # Alternatively, unblock manually based on duration or counter
             for start, end in list(self.city.blocked_routes):
                 self.city.unblock_route(start, end)  # Manually unblock each route
             self.unblock_counter = 0  # Reset the unblock counter after unblocking all routes
 
+    def move_buses(self):
+        """Move every bus one cell; riders on a blocked route get off."""
         # Check for blocked routes and passengers get off if necessary
-        for bus in self.buses:
+        self.buses_at = {}
+        metrics = self.metrics
+        engine = self.passenger_engine is not None  # The engine adds its riders and records each bus's load sample
+        self.carried = []
+        route_ends = {point for route in self.city.blocked_routes for point in route}
+        for index, bus in enumerate(self.buses):
+            bus.profiler = self.profiler
+            position, served_stops = bus.position, bus.served_stops
             bus.move()
-            for passenger in bus.passengers:
-                passenger.on_bus_route_blocked(self.city.blocked_routes)  # Check if the bus route is blocked
-
-        # Update passengers (those not on a bus will move towards their destination)
+            order = (self.step_count, index if self.bus_seq is None else self.bus_seq[bus])
+            metrics.record_bus_move(position if bus.served_stops != served_stops else None, len(bus.passengers),
+                                    sample=not engine, order=order)
+            self.carried.append(len(bus.passengers))
+            if bus.passengers and bus.position in route_ends:  # Only then can a rider find the route blocked
+                if self.agenda is not None:
+                    self.agenda.stranded(bus, position)
+                for passenger in list(bus.passengers):
+                    passenger.on_bus_route_blocked(self.city.blocked_routes)
+            self.buses_at.setdefault(bus.position, []).append(bus)
+        metrics.occupied_cells = len(self.buses_at)
+
+    def update_passengers(self):
+        """Update passengers (those not on a bus will move towards their destination) and note who may board."""
+        self.waiting_at = {}
+        metrics = self.metrics
         for passenger in self.passengers:
-            passenger.update(self.buses, self.step_count)  # Pass step_count here
-            if passenger.journey_complete:
-                self.total_passenger_transport += 1  # Increment total number of passengers transported
-
-        self.print_state()
+            was_complete = passenger.journey_complete
+            passenger.update(self.buses, self.step_count, board=False, route_index=self.route_index)  # Pass step_count here
+            if passenger.ready_to_board:
+                self.waiting_at.setdefault(passenger.current_position, []).append(passenger)
+            if passenger.journey_complete and not was_complete:
+                self.total_passenger_transport += 1  # Count each journey once, when it completes
+                metrics.record_completion(passenger.get_travel_time())
+
+    def enable_event_scheduling(self) -> PassengerAgenda:
+        """Update only passengers with something happening at each step; results match updating everyone."""
+        if self.agenda is None:
+            self.agenda = PassengerAgenda(self)
+        return self.agenda
+
+    def disable_event_scheduling(self):
+        """Go back to updating every passenger at each step."""
+        self.sync_passengers()
+        self.agenda = None
+
+    def sync_passengers(self):
+        """Bring the fields of passengers skipped by event scheduling up to date before reading them."""
+        if self.agenda is not None:
+            self.agenda.sync(self.step_count)
+
+    def enable_profiling(self, history: int = 1000) -> StepProfiler:
+        """Start recording per-phase and per-routing-call timings; read them with profiler.stats()."""
+        self.profiler = StepProfiler(history)
+        self.city.profiler = self.profiler
+        return self.profiler
+
+    def disable_profiling(self):
+        """Stop recording timings."""
+        self.profiler = None
+        self.city.profiler = None
+        for bus in self.buses:
+            bus.profiler = None
+
+    def refresh_route_index(self):
+        """Rebuild the route index if buses were added or removed or a route changed."""
+        bus_routes = [bus.route for bus in self.buses]
+        if not self.route_index.matches(bus_routes):
+            self.route_index = RouteIndex(bus_routes)
+
+    def board_waiting_passengers(self):
+        """Board waiting passengers in one pass over the stops where both passengers and buses are present."""
+        for stop, passengers in self.waiting_at.items():
+            buses = self.buses_at.get(stop)
+            if buses:
+                for passenger in passengers:
+                    waiting_time = passenger.waiting_time
+                    if passenger.try_board(buses, self.step_count):
+                        self.metrics.record_boarding(waiting_time)
 
     def print_state(self):
         """Print the state of the simulation."""
-        vehicle_metrics = {
-            "served_stops": 0,
-            "total_passenger_loads": 0,
-            "timings": [],
-        }
-
-        for bus in self.buses:
-            print(f"Bus {bus.id} at {bus.position} with {len(bus.passengers)} passengers.")
-            vehicle_metrics["served_stops"] += bus.served_stops
-            vehicle_metrics["total_passenger_loads"] += bus.total_passenger_loads
-            vehicle_metrics["timings"].append(bus.timings)
-
-        for passenger in self.passengers:
-            print(f"Passenger {passenger.id} at {passenger.current_position} with target {passenger.target_stop}.")
+        if events.enabled(events.DEBUG):
+            self.sync_passengers()
+            for bus in self.buses:
+                events.emit(events.DEBUG, "bus_state", "Bus {bus} at {position} with {load} passengers.",
+                            bus=bus.id, position=bus.position, load=len(bus.passengers))
 
-        # Print blocked routes
-        self.print_blocked_routes()
-
-        # Print travel times for passengers after simulation ends
-        if self.step_count >= 100:
             for passenger in self.passengers:
-                travel_time = passenger.get_travel_time()
-                if travel_time is not None:
-                    print(f"Passenger {passenger.id} took {travel_time} steps to reach their destination.")
-                else:
-                    print(f"Passenger {passenger.id} has not completed their journey yet.")
-        
-        # Final System Metrics
-        self.print_system_metrics(vehicle_metrics)
-
-    def print_system_metrics(self, vehicle_metrics):
-        """Print the system metrics."""
-        total_throughput = self.total_passenger_transport  # Total passengers transported
-        grid_utilization = self.calculate_grid_utilization()
-
-        print("\nSimulation Summary:")
-        print(f"Total throughput: {total_throughput} passengers.")
-        print(f"Average grid utilization: {grid_utilization}%")
-        print(f"Total number of people transported: {self.total_passenger_transport}")
-        print(f"Vehicle Metrics:")
-        print(f"  - Total bus stops served: {vehicle_metrics['served_stops']}")
-        print(f"  - Total passenger loads: {vehicle_metrics['total_passenger_loads']}")
+                events.emit(events.DEBUG, "passenger_state", "Passenger {passenger} at {position} with target {stop}.",
+                            passenger=passenger.id, position=passenger.current_position, stop=passenger.target_stop)
+
+            # Print blocked routes
+            self.print_blocked_routes()
+
+            # Print travel times for passengers after simulation ends
+            if self.step_count >= 100:
+                live = ((passenger.id, passenger.get_travel_time()) for passenger in self.passengers)
+                for passenger_id, travel_time in itertools.chain(self.archive.travel_times(), live):
+                    if travel_time is not None:
+                        events.emit(events.DEBUG, "travel_time", "Passenger {passenger} took {steps} steps to reach their destination.",
+                                    passenger=passenger_id, steps=travel_time)
+                    else:
+                        events.emit(events.DEBUG, "travel_time", "Passenger {passenger} has not completed their journey yet.",
+                                    passenger=passenger_id, steps=None)
+
+        if events.enabled(events.SUMMARY):
+            self.print_system_metrics()
+
+    def print_system_metrics(self):
+        """Print the system metrics from the running counters."""
+        metrics = self.metrics
+        events.emit(
+            events.SUMMARY,
+            "summary",
+            "\nSimulation Summary:\n"
+            "Total throughput: {throughput} passengers.\n"
+            "Average grid utilization: {utilization}%\n"
+            "Total number of people transported: {transported}\n"
+            "Vehicle Metrics:\n"
+            "  - Total bus stops served: {served_stops}\n"
+            "  - Total passenger loads: {passenger_loads}",
+            throughput=metrics.passengers_transported,
+            utilization=metrics.grid_utilization,
+            transported=metrics.passengers_transported,
+            served_stops=metrics.served_stops,
+            passenger_loads=metrics.passenger_loads,
+        )
 
     def print_blocked_routes(self):
         """Helper function to print blocked routes."""
-        print("Blocked routes:", self.city.blocked_routes)
+        events.emit(events.DEBUG, "blocked_routes", "Blocked routes: {routes}", routes=self.city.blocked_routes)
 
     def calculate_grid_utilization(self):
         """Calculate the grid utilization based on occupied cells by buses."""
@@ -0,0 +1,287 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Passenger states stored in PassengerEngine.state
+WALKING = 0  # Heading for target_stop on foot
+WAITING = 1  # Standing at target_stop until a suitable bus arrives
+RIDING = 2  # On the bus at index PassengerEngine.bus
+DONE = 3  # Journey complete
+
+NO_STOP = -1  # Coordinate value of an unset target stop
+NO_TIME = -1  # Value of an unset start_time / end_time
+NOT_A_CANDIDATE = np.iinfo(np.int64).max
+
+
+class PassengerView:
+    """Read-only Passenger-like view of one row of a PassengerEngine."""
+
+    __slots__ = ("engine", "index")
+
+    def __init__(self, engine: "PassengerEngine", index: int):
+        self.engine = engine
+        self.index = index
+
+    @property
+    def id(self) -> int:
+        return int(self.engine.ids[self.index])
+
+    @property
+    def current_position(self) -> Tuple[int, int]:
+        return (int(self.engine.x[self.index]), int(self.engine.y[self.index]))
+
+    @property
+    def destination(self) -> Tuple[int, int]:
+        return (int(self.engine.dest_x[self.index]), int(self.engine.dest_y[self.index]))
+
+    @property
+    def target_stop(self) -> Optional[Tuple[int, int]]:
+        if self.engine.target_x[self.index] == NO_STOP:
+            return None
+        return (int(self.engine.target_x[self.index]), int(self.engine.target_y[self.index]))
+
+    @property
+    def on_bus(self):
+        bus = self.engine.bus[self.index]
+        return self.engine.buses[bus] if bus >= 0 else None
+
+    @property
+    def waiting_time(self) -> int:
+        return int(self.engine.waiting[self.index])
+
+    @property
+    def max_waiting_time(self) -> int:
+        return int(self.engine.max_waiting[self.index])
+
+    @property
+    def journey_complete(self) -> bool:
+        return bool(self.engine.state[self.index] == DONE)
+
+    @property
+    def start_time(self) -> Optional[int]:
+        value = self.engine.start_time[self.index]
+        return None if value == NO_TIME else int(value)
+
+    @property
+    def end_time(self) -> Optional[int]:
+        value = self.engine.end_time[self.index]
+        return None if value == NO_TIME else int(value)
+
+    def get_travel_time(self):
+        """Calculate the time taken for the passenger to complete their journey."""
+        if self.start_time is not None and self.end_time is not None:
+            return self.end_time - self.start_time
+        return None
+
+
+class PassengerEngine:
+    """Struct-of-arrays passenger store that advances every passenger with batched NumPy operations.
+
+    It follows the same rules as Passenger.update (walk one diagonal step towards the nearest
+    useful stop, wait, give up and look again after max_waiting_time, board the first bus at the
+    stop whose route contains the destination, ride until the destination), without printing.
+    Riders on a bus that reaches the end of a blocked route all get off, as in
+    Passenger.on_bus_route_blocked, and a passenger whose journey completes at the stop
+    they board at leaves the bus instead of staying in its load.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.buses = []
+        self._routes = None
+        self._destination_keys: Dict[Tuple[int, int], int] = {}
+        self._stop_x = np.zeros(0, dtype=np.int64)
+        self._stop_y = np.zeros(0, dtype=np.int64)
+        self._stop_rank = np.zeros((0, 0), dtype=np.int64)  # Destination key x stop -> lookup order, NOT_A_CANDIDATE if unusable
+        self._on_route = np.zeros((0, 0), dtype=bool)  # Destination key x bus -> route contains the destination
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        """Grow every column to hold capacity passengers, keeping the existing rows."""
+        columns = {
+            "ids": (np.int64, 0),
+            "x": (np.int64, 0),
+            "y": (np.int64, 0),
+            "dest_x": (np.int64, 0),
+            "dest_y": (np.int64, 0),
+            "dest_key": (np.int64, 0),
+            "target_x": (np.int64, NO_STOP),
+            "target_y": (np.int64, NO_STOP),
+            "waiting": (np.int64, 0),
+            "max_waiting": (np.int64, 5),
+            "state": (np.int8, WALKING),
+            "bus": (np.int64, -1),
+            "start_time": (np.int64, NO_TIME),
+            "end_time": (np.int64, NO_TIME),
+        }
+        for name, (dtype, fill) in columns.items():
+            column = np.full(capacity, fill, dtype=dtype)
+            if hasattr(self, name):
+                column[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, column)
+        self.capacity = capacity
+
+    def add(self, id: int, current_position: Tuple[int, int], destination: Tuple[int, int], max_waiting_time: int = 5) -> PassengerView:
+        """Add a passenger and return a view of it."""
+        if self.size == self.capacity:
+            self._allocate(self.capacity * 2)
+        index = self.size
+        self.size += 1
+        self.ids[index] = id
+        self.x[index], self.y[index] = current_position
+        self.dest_x[index], self.dest_y[index] = destination
+        self.max_waiting[index] = max_waiting_time
+        if destination not in self._destination_keys:
+            self._destination_keys[destination] = len(self._destination_keys)
+            self._routes = None  # Lookup tables need a row for the new destination
+        self.dest_key[index] = self._destination_keys[destination]
+        return PassengerView(self, index)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, index: int) -> PassengerView:
+        if not -self.size <= index < self.size:
+            raise IndexError("passenger index out of range")
+        return PassengerView(self, index % self.size)
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield PassengerView(self, index)
+
+    def _sync_routes(self, buses: List):
+        """Rebuild the destination lookup tables when the buses or their routes change."""
+        self.buses = buses
+        routes = [tuple(bus.route) for bus in buses]
+        if routes == self._routes:
+            return
+        self._routes = routes
+
+        stops = []
+        stop_index = {}
+        for route in routes:
+            for stop in route:
+                if stop not in stop_index:
+                    stop_index[stop] = len(stops)
+                    stops.append(stop)
+        self._stop_x = np.array([stop[0] for stop in stops], dtype=np.int64)
+        self._stop_y = np.array([stop[1] for stop in stops], dtype=np.int64)
+
+        # Rank candidates in the order Passenger.find_nearest_stop visits them, so ties resolve the same way
+        self._stop_rank = np.full((len(self._destination_keys), len(stops)), NOT_A_CANDIDATE, dtype=np.int64)
+        self._on_route = np.zeros((len(self._destination_keys), len(routes)), dtype=bool)
+        for destination, key in self._destination_keys.items():
+            order = 0
+            for bus_index, route in enumerate(routes):
+                if destination in route:
+                    self._on_route[key, bus_index] = True
+                    for stop in route:
+                        column = stop_index[stop]
+                        if self._stop_rank[key, column] == NOT_A_CANDIDATE:
+                            self._stop_rank[key, column] = order
+                        order += 1
+
+    def _find_nearest_stops(self, rows: np.ndarray):
+        """Point the given passengers at their nearest stop on a route that reaches their destination."""
+        if not len(rows) or not len(self._stop_x):
+            self.target_x[rows] = NO_STOP
+            self.target_y[rows] = NO_STOP
+            return
+        distance = (np.abs(self._stop_x[None, :] - self.x[rows, None])
+                    + np.abs(self._stop_y[None, :] - self.y[rows, None]))
+        rank = self._stop_rank[self.dest_key[rows]]
+        score = np.where(rank == NOT_A_CANDIDATE, NOT_A_CANDIDATE, distance * (len(self._stop_x) * len(self._routes) + 1) + rank)
+        best = np.argmin(score, axis=1)
+        found = score[np.arange(len(rows)), best] != NOT_A_CANDIDATE
+        self.target_x[rows] = np.where(found, self._stop_x[best], NO_STOP)
+        self.target_y[rows] = np.where(found, self._stop_y[best], NO_STOP)
+
+    def update(self, buses: List, step_count: int, blocked_routes=(), metrics=None,
+               carried: Optional[List[int]] = None) -> int:
+        """Advance every passenger by one step and return how many completed their journey during it.
+
+        Loads, boardings and completions are also counted into metrics (a metrics.MetricsAccumulator) when given,
+        with one bus_load sample per bus; carried holds the riders each bus carried outside the engine during
+        the same move, which join its sample.
+        """
+        self._sync_routes(buses)
+        n = self.size
+        x, y = self.x[:n], self.y[:n]
+        state, bus = self.state[:n], self.bus[:n]
+        bus_x = np.array([b.position[0] for b in buses], dtype=np.int64)
+        bus_y = np.array([b.position[1] for b in buses], dtype=np.int64)
+
+        # Count the riders each bus carried during its move, like PublicTransport.move does
+        riding = state == RIDING
+        loads = np.bincount(bus[riding], minlength=len(buses))
+        for bus_index, load in enumerate(loads):
+            buses[bus_index].total_passenger_loads += int(load)
+        if metrics is not None:
+            metrics.passenger_loads += int(loads.sum())
+            for bus_index, load in enumerate(loads):
+                metrics.bus_load.add(int(load) + (carried[bus_index] if carried is not None else 0))
+
+        # Riders on a bus at either end of a blocked route get off where they last were
+        if blocked_routes and riding.any():
+            blocked_ends = {point for route in blocked_routes for point in route}
+            stranded = np.array([b.position in blocked_ends for b in buses], dtype=bool)
+            off = riding & stranded[np.maximum(bus, 0)]
+            state[off] = WALKING
+            bus[off] = -1
+            riding &= ~off
+
+        # Riders move with their bus and leave it at their destination
+        rows = np.flatnonzero(riding)
+        x[rows] = bus_x[bus[rows]]
+        y[rows] = bus_y[bus[rows]]
+        arrived = riding & (x == self.dest_x[:n]) & (y == self.dest_y[:n])
+        end_time = self.end_time[:n]
+        end_time[arrived & (end_time == NO_TIME)] = step_count
+        state[arrived] = DONE
+        bus[arrived] = -1
+
+        free = (state == WALKING) | (state == WAITING)
+        self._find_nearest_stops(np.flatnonzero(free & (self.target_x[:n] == NO_STOP)))
+        target_x, target_y = self.target_x[:n], self.target_y[:n]
+        has_target = target_x != NO_STOP
+        at_stop = free & has_target & (x == target_x) & (y == target_y)
+
+        # Walkers take one (possibly diagonal) step towards their target stop
+        walking = free & has_target & ~at_stop
+        x[walking] += np.sign(target_x[walking] - x[walking])
+        y[walking] += np.sign(target_y[walking] - y[walking])
+        state[walking] = WALKING
+
+        # Waiters count down their patience and look for another stop once it runs out
+        waiting = self.waiting[:n]
+        waiting[at_stop] += 1
+        impatient = at_stop & (waiting > self.max_waiting[:n])
+        self._find_nearest_stops(np.flatnonzero(impatient))
+        waiting[impatient] = 0
+        state[at_stop] = WAITING
+
+        # Board the first bus at the stop whose route reaches the destination
+        on_route = self._on_route[self.dest_key[:n]] if len(buses) else None
+        start_time = self.start_time[:n]
+        for bus_index in range(len(buses)):
+            boarding = (at_stop & (state == WAITING) & (x == bus_x[bus_index]) & (y == bus_y[bus_index])
+                        & on_route[:, bus_index])
+            if metrics is not None:
+                for waiting_time in waiting[boarding].tolist():
+                    metrics.record_boarding(waiting_time)
+            state[boarding] = RIDING
+            bus[boarding] = bus_index
+            start_time[boarding & (start_time == NO_TIME)] = step_count
+
+        # Anyone standing on their destination is done
+        reached = (state != DONE) & (x == self.dest_x[:n]) & (y == self.dest_y[:n])
+        state[reached] = DONE
+        bus[reached] = -1
+
+        completed = np.flatnonzero(arrived | reached)
+        if metrics is not None:
+            travel_times = (end_time[completed] - start_time[completed]).tolist()
+            has_times = ((end_time[completed] != NO_TIME) & (start_time[completed] != NO_TIME)).tolist()
+            for travel_time, has_time in zip(travel_times, has_times):
+                metrics.record_completion(travel_time if has_time else None)
+        return len(completed)
@@ -0,0 +1,93 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# Phases of Simulation.run_step, in the order they run
+PHASES = ["demand", "disturbance", "route_fix", "buses", "passengers", "boarding", "output"]
+
+
+class StepProfiler:
+    """Record wall time and call counts per run_step phase, per tick and per routing call.
+
+    Simulation.run_step only touches the profiler when one is installed, so an idle
+    simulation pays a handful of None checks per step.
+    """
+
+    def __init__(self, history: int = 1000, routing_history: int = 1000):
+        self.steps = 0
+        self.phase_seconds = {phase: 0.0 for phase in PHASES}
+        self.phase_calls = {phase: 0 for phase in PHASES}
+        self.ticks = deque(maxlen=history)  # Most recent per-tick records
+        self.routing_calls = 0
+        self.routing_seconds = 0.0
+        self.nodes_expanded = 0
+        self.path_cells = 0
+        self.path_calls = 0  # Routing calls that returned a path length (D* Lite replans do not)
+        self.routing_log = deque(maxlen=routing_history)  # Most recent per-call records
+        self._tick = None
+
+    def start_tick(self, step: int) -> float:
+        """Open the record for a step and return the time its first phase starts."""
+        self._tick = {"step": step, "phases": {}, "routing_calls": 0, "nodes_expanded": 0, "seconds": 0.0}
+        return time.perf_counter()
+
+    def lap(self, phase: str, since: float) -> float:
+        """Charge the time since the previous lap to a phase and return the current time."""
+        now = time.perf_counter()
+        elapsed = now - since
+        self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + elapsed
+        self.phase_calls[phase] = self.phase_calls.get(phase, 0) + 1
+        phases = self._tick["phases"]
+        phases[phase] = phases.get(phase, 0.0) + elapsed
+        self._tick["seconds"] += elapsed
+        return now
+
+    def end_tick(self):
+        """Close the current step's record."""
+        self.steps += 1
+        self.ticks.append(self._tick)
+        self._tick = None
+
+    def record_routing(self, bus_id, strategy: str, expanded: int, path_length: Optional[int], seconds: float):
+        """Record one routing call made by a bus (bus_id None for work on the city's shared distance fields)."""
+        self.routing_calls += 1
+        self.routing_seconds += seconds
+        self.nodes_expanded += expanded
+        if path_length is not None:
+            self.path_cells += path_length
+            self.path_calls += 1
+        if self._tick is not None:
+            self._tick["routing_calls"] += 1
+            self._tick["nodes_expanded"] += expanded
+        self.routing_log.append({
+            "step": self._tick["step"] if self._tick is not None else None,
+            "bus": bus_id,
+            "strategy": strategy,
+            "expanded": expanded,
+            "path_length": path_length,
+            "ms": seconds * 1000,
+        })
+
+    def stats(self, slowest: int = 5, recent: int = 5) -> Dict:
+        """Summarize everything recorded so far as plain data (ready for JSON).
+
+        slowest is how many of the slowest recorded ticks to list, recent how many of the latest routing calls.
+        """
+        phases = {}
+        for phase, seconds in self.phase_seconds.items():
+            calls = self.phase_calls.get(phase, 0)
+            phases[phase] = {"seconds": seconds, "calls": calls, "mean_ms": seconds / calls * 1000 if calls else 0.0}
+        return {
+            "steps": self.steps,
+            "phases": phases,
+            "routing": {
+                "calls": self.routing_calls,
+                "seconds": self.routing_seconds,
+                "nodes_expanded": self.nodes_expanded,
+                "mean_expanded": self.nodes_expanded / self.routing_calls if self.routing_calls else 0.0,
+                "mean_path_length": self.path_cells / self.path_calls if self.path_calls else 0.0,
+                "recent": list(self.routing_log)[-recent:] if recent else [],
+            },
+            "last_tick": self.ticks[-1] if self.ticks else None,
+            "slowest_ticks": sorted(self.ticks, key=lambda tick: tick["seconds"], reverse=True)[:slowest],
+        }
@@ -0,0 +1,96 @@
+from typing import Dict, List, Optional, Tuple
+
+LINEAR_SCAN_LIMIT = 16  # Candidate lists up to this size are scanned directly instead of through buckets
+
+
+class StopBuckets:
+    """Uniform grid of buckets over a set of stops for nearest-stop queries under the Manhattan distance."""
+
+    def __init__(self, stops: List[Tuple[int, int]], bucket_size: int):
+        self.bucket_size = bucket_size
+        self.buckets: Dict[Tuple[int, int], List[Tuple[int, int, Tuple[int, int]]]] = {}
+        min_bx = min_by = max_bx = max_by = None
+        for rank, stop in enumerate(stops):
+            bx, by = stop[0] // bucket_size, stop[1] // bucket_size
+            self.buckets.setdefault((bx, by), []).append((rank, stop))
+            min_bx = bx if min_bx is None else min(min_bx, bx)
+            max_bx = bx if max_bx is None else max(max_bx, bx)
+            min_by = by if min_by is None else min(min_by, by)
+            max_by = by if max_by is None else max(max_by, by)
+        self.bounds = (min_bx, min_by, max_bx, max_by)
+
+    def nearest(self, position: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Return the closest stop, breaking ties by the order the stops were given in."""
+        size = self.bucket_size
+        qx, qy = position[0] // size, position[1] // size
+        min_bx, min_by, max_bx, max_by = self.bounds
+        # Rings beyond this radius cannot contain any bucket
+        max_ring = max(abs(qx - min_bx), abs(qx - max_bx), abs(qy - min_by), abs(qy - max_by))
+        best = None  # (distance, rank, stop)
+        ring = 0
+        while ring <= max_ring:
+            # Any stop in ring r is at least (r - 1) * size + 1 cells away along one axis
+            if best is not None and ring > 0 and (ring - 1) * size + 1 > best[0]:
+                break
+            for bx in range(qx - ring, qx + ring + 1):
+                for by in (range(qy - ring, qy + ring + 1) if abs(bx - qx) == ring else (qy - ring, qy + ring)):
+                    for rank, stop in self.buckets.get((bx, by), ()):
+                        candidate = (abs(stop[0] - position[0]) + abs(stop[1] - position[1]), rank, stop)
+                        if best is None or candidate < best:
+                            best = candidate
+            ring += 1
+        return best[2] if best is not None else None
+
+
+class RouteIndex:
+    """Map each destination to the stops of the routes that serve it, with nearest-stop lookups.
+
+    Candidates are kept in the order Passenger.find_nearest_stop visits them (routes in bus
+    order, stops in route order), so ties resolve to the same stop as the linear scan.
+    """
+
+    def __init__(self, bus_routes: List[List[Tuple[int, int]]], bucket_size: int = 8):
+        self.routes = [tuple(route) for route in bus_routes]
+        self.candidates: Dict[Tuple[int, int], List[Tuple[int, int]]] = {}
+        routes_serving: Dict[Tuple[int, int], List[int]] = {}
+        for route_index, route in enumerate(self.routes):
+            for stop in route:
+                serving = routes_serving.setdefault(stop, [])
+                if not serving or serving[-1] != route_index:
+                    serving.append(route_index)
+
+        self.buckets: Dict[Tuple[int, int], StopBuckets] = {}
+        for destination, serving in routes_serving.items():
+            stops = []
+            seen = set()
+            for route_index in serving:
+                for stop in self.routes[route_index]:
+                    if stop not in seen:
+                        seen.add(stop)
+                        stops.append(stop)
+            self.candidates[destination] = stops
+            if len(stops) > LINEAR_SCAN_LIMIT:
+                self.buckets[destination] = StopBuckets(stops, bucket_size)
+
+    def matches(self, bus_routes: List[List[Tuple[int, int]]]) -> bool:
+        """Check if the index was built from these routes."""
+        return len(bus_routes) == len(self.routes) and all(
+            tuple(route) == indexed for route, indexed in zip(bus_routes, self.routes)
+        )
+
+    def serves(self, destination: Tuple[int, int]) -> bool:
+        """Check if any route stops at the destination."""
+        return destination in self.candidates
+
+    def nearest_stop(self, position: Tuple[int, int], destination: Tuple[int, int]) -> Optional[Tuple[int, int]]:
+        """Return the nearest stop on a route that reaches the destination, or None if no route does."""
+        if destination in self.buckets:
+            return self.buckets[destination].nearest(position)
+        best = None
+        min_distance = float('inf')
+        for stop in self.candidates.get(destination, ()):
+            distance = abs(stop[0] - position[0]) + abs(stop[1] - position[1])
+            if distance < min_distance:
+                min_distance = distance
+                best = stop
+        return best
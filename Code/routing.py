@@ -0,0 +1,472 @@
+import heapq
+from array import array
+from collections import deque, namedtuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+WALL = 0xFFFF  # Occupancy grid value of the padding cells around the city
+
+# Result of a single routing query: the path (start -> goal, empty if unreachable)
+# and how many nodes the strategy expanded to find it.
+SearchResult = namedtuple("SearchResult", ["path", "expanded"])
+
+
+def _offsets(city) -> Tuple[int, int, int, int]:
+    """Neighbor offsets in occupancy grid indices: Up, Down, Left, Right."""
+    return (-1, 1, -city.stride, city.stride)
+
+
+def _reconstruct(predecessors: Dict[int, int], current: int, city) -> List[Tuple[int, int]]:
+    """Walk the predecessor links back from current and return the start -> current path."""
+    path = []
+    while current is not None:
+        path.append(city.cell_position(current))
+        current = predecessors[current]
+    return path[::-1]
+
+
+def _dijkstra(start: int, goal: int, city) -> SearchResult:
+    """Uniform-cost search with a binary heap and no heuristic.
+
+    Heap entries carry the cell's (x, y) after the distance so equal-distance cells pop in the
+    same order as the original tuple-keyed search, which keeps its choice among equal-length paths.
+    """
+    grid = city.grid
+    stride = city.stride
+    offsets = _offsets(city)
+    start_y, start_x = divmod(start, stride)
+    pq = [(0, start_x, start_y, start)]
+    distances = {start: 0}
+    predecessors = {start: None}
+    expanded = 0
+
+    while pq:
+        current_dist, _, _, current = heapq.heappop(pq)
+        if current_dist > distances[current]:
+            continue  # Stale heap entry
+        if current == goal:
+            return SearchResult(_reconstruct(predecessors, current, city), expanded)
+        expanded += 1
+
+        for offset in offsets:
+            neighbor = current + offset
+            if grid[neighbor]:
+                # Skip positions outside the city (the padding wall) or blocked positions
+                continue
+            tentative_dist = current_dist + 1
+            if neighbor not in distances or tentative_dist < distances[neighbor]:
+                distances[neighbor] = tentative_dist
+                predecessors[neighbor] = current
+                y, x = divmod(neighbor, stride)
+                heapq.heappush(pq, (tentative_dist, x, y, neighbor))
+
+    return SearchResult([], expanded)
+
+
+def _astar(start: int, goal: int, city) -> SearchResult:
+    """A* with the Manhattan distance, which is exact on an open 4-connected grid."""
+    grid = city.grid
+    stride = city.stride
+    offsets = _offsets(city)
+    goal_y, goal_x = divmod(goal, stride)
+
+    def heuristic(index):
+        y, x = divmod(index, stride)
+        return abs(x - goal_x) + abs(y - goal_y)
+
+    # Ties on f are broken towards the smaller heuristic, i.e. the node closest to the goal
+    start_h = heuristic(start)
+    pq = [(start_h, start_h, start)]
+    distances = {start: 0}
+    predecessors = {start: None}
+    expanded = 0
+
+    while pq:
+        f, h, current = heapq.heappop(pq)
+        current_dist = f - h
+        if current_dist > distances[current]:
+            continue  # Stale heap entry
+        if current == goal:
+            return SearchResult(_reconstruct(predecessors, current, city), expanded)
+        expanded += 1
+
+        for offset in offsets:
+            neighbor = current + offset
+            if grid[neighbor]:
+                continue
+            tentative_dist = current_dist + 1
+            if neighbor not in distances or tentative_dist < distances[neighbor]:
+                distances[neighbor] = tentative_dist
+                predecessors[neighbor] = current
+                neighbor_h = heuristic(neighbor)
+                heapq.heappush(pq, (tentative_dist + neighbor_h, neighbor_h, neighbor))
+
+    return SearchResult([], expanded)
+
+
+def _bidirectional_bfs(start: int, goal: int, city) -> SearchResult:
+    """Breadth-first search grown level by level from both ends, always expanding the smaller frontier."""
+    if start == goal:
+        return SearchResult([city.cell_position(start)], 0)
+    grid = city.grid
+    if grid[goal]:
+        return SearchResult([], 0)  # A blocked goal can never be entered
+    offsets = _offsets(city)
+    forward_parents = {start: None}
+    backward_parents = {goal: None}
+    forward_frontier = [start]
+    backward_frontier = [goal]
+    expanded = 0
+
+    while forward_frontier and backward_frontier:
+        forward = len(forward_frontier) <= len(backward_frontier)
+        if forward:
+            frontier, parents, others = forward_frontier, forward_parents, backward_parents
+        else:
+            frontier, parents, others = backward_frontier, backward_parents, forward_parents
+
+        # No cell is ever in both parent maps before the searches meet, so the first
+        # meeting cell is on the other side's frontier and gives a shortest path.
+        meeting = None
+        next_frontier = []
+        for current in frontier:
+            expanded += 1
+            for offset in offsets:
+                neighbor = current + offset
+                if neighbor in parents or (grid[neighbor] and neighbor != start):
+                    continue
+                parents[neighbor] = current
+                if neighbor in others:
+                    meeting = neighbor
+                    break
+                next_frontier.append(neighbor)
+            if meeting is not None:
+                break
+
+        if meeting is not None:
+            path = _reconstruct(forward_parents, meeting, city)
+            current = backward_parents[meeting]
+            while current is not None:
+                path.append(city.cell_position(current))
+                current = backward_parents[current]
+            return SearchResult(path, expanded)
+
+        if forward:
+            forward_frontier = next_frontier
+        else:
+            backward_frontier = next_frontier
+
+    return SearchResult([], expanded)
+
+
+def _jump_point_search(start: int, goal: int, city) -> SearchResult:
+    """Jump point search for 4-connected grids.
+
+    Canonical paths move horizontally first and turn vertically anywhere, so horizontal
+    jumps scan vertically at every cell, while vertical jumps only stop at the goal or
+    at a forced horizontal neighbor (a side cell that opens up behind an obstacle).
+    Only jump points are pushed on the heap, which makes open areas nearly free.
+    """
+    grid = city.grid
+    stride = city.stride
+    goal_y, goal_x = divmod(goal, stride)
+
+    def heuristic(index):
+        y, x = divmod(index, stride)
+        return abs(x - goal_x) + abs(y - goal_y)
+
+    def has_forced_neighbor(index, dv):
+        return (not grid[index + 1] and grid[index - dv + 1]) or (not grid[index - 1] and grid[index - dv - 1])
+
+    def jump_vertical(index, dv):
+        while True:
+            index += dv
+            if grid[index]:
+                return None
+            if index == goal or has_forced_neighbor(index, dv):
+                return index
+
+    def jump_horizontal(index, dh):
+        while True:
+            index += dh
+            if grid[index]:
+                return None
+            if index == goal:
+                return index
+            if jump_vertical(index, stride) is not None or jump_vertical(index, -stride) is not None:
+                return index
+
+    start_h = heuristic(start)
+    pq = [(start_h, start_h, start)]
+    distances = {start: 0}
+    predecessors = {start: None}
+    expanded = 0
+
+    while pq:
+        f, h, current = heapq.heappop(pq)
+        current_dist = f - h
+        if current_dist > distances[current]:
+            continue
+        if current == goal:
+            # Expand the jump points back into a cell-by-cell path
+            jump_points = []
+            while current is not None:
+                jump_points.append(current)
+                current = predecessors[current]
+            jump_points.reverse()
+            path = [city.cell_position(start)]
+            for previous, following in zip(jump_points, jump_points[1:]):
+                diff = following - previous
+                step = (1 if diff > 0 else -1) if abs(diff) < stride else (stride if diff > 0 else -stride)
+                for index in range(previous + step, following + step, step):
+                    path.append(city.cell_position(index))
+            return SearchResult(path, expanded)
+        expanded += 1
+
+        parent = predecessors[current]
+        if parent is None:
+            directions = [(1, False), (-1, False), (stride, True), (-stride, True)]
+        else:
+            diff = current - parent
+            if abs(diff) < stride:
+                dh = 1 if diff > 0 else -1
+                directions = [(dh, False), (stride, True), (-stride, True)]
+            else:
+                dv = stride if diff > 0 else -stride
+                directions = [(dv, True)]
+                for dh in (1, -1):
+                    if not grid[current + dh] and grid[current - dv + dh]:
+                        directions.append((dh, False))
+
+        for direction, vertical in directions:
+            if vertical:
+                jump_point = jump_vertical(current, direction)
+            else:
+                jump_point = jump_horizontal(current, direction)
+            if jump_point is None:
+                continue
+            distance = abs(jump_point - current)
+            if vertical:
+                distance //= stride
+            tentative_dist = current_dist + distance
+            if jump_point not in distances or tentative_dist < distances[jump_point]:
+                distances[jump_point] = tentative_dist
+                predecessors[jump_point] = current
+                jump_h = heuristic(jump_point)
+                heapq.heappush(pq, (tentative_dist + jump_h, jump_h, jump_point))
+
+    return SearchResult([], expanded)
+
+
+STRATEGIES: Dict[str, Callable[[int, int, object], SearchResult]] = {
+    "dijkstra": _dijkstra,
+    "astar": _astar,
+    "bidirectional_bfs": _bidirectional_bfs,
+    "jps": _jump_point_search,
+}
+
+
+def search(start: Tuple[int, int], goal: Tuple[int, int], city, strategy: str = "astar") -> SearchResult:
+    """Find a shortest path with the named strategy and report how many nodes it expanded."""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown routing strategy {strategy!r}. Choose from {sorted(STRATEGIES)}.")
+    return STRATEGIES[strategy](city.cell_index(start), city.cell_index(goal), city)
+
+
+def astar(start: Tuple[int, int], goal: Tuple[int, int], city) -> List[Tuple[int, int]]:
+    """Drop-in replacement for model.dijkstra using A* with a Manhattan heuristic."""
+    return search(start, goal, city, "astar").path
+
+
+def bidirectional_bfs(start: Tuple[int, int], goal: Tuple[int, int], city) -> List[Tuple[int, int]]:
+    """Drop-in replacement for model.dijkstra using bidirectional breadth-first search."""
+    return search(start, goal, city, "bidirectional_bfs").path
+
+
+def jump_point_search(start: Tuple[int, int], goal: Tuple[int, int], city) -> List[Tuple[int, int]]:
+    """Drop-in replacement for model.dijkstra using jump point search, best on open grids."""
+    return search(start, goal, city, "jps").path
+
+
+UNREACHABLE = 0x7FFFFFFF  # Distance field value of cells that cannot reach the goal
+INFINITY = float("inf")
+
+
+def distance_field(goal: int, city) -> array:
+    """Reverse breadth-first search from goal: the step count from every grid index to goal."""
+    grid = city.grid
+    offsets = _offsets(city)
+    field = array('i', [UNREACHABLE]) * len(grid)
+    if grid[goal]:
+        return field  # A blocked goal cannot be reached from anywhere
+    field[goal] = 0
+    frontier = deque([goal])
+    while frontier:
+        current = frontier.popleft()
+        next_dist = field[current] + 1
+        for offset in offsets:
+            neighbor = current + offset
+            if not grid[neighbor] and field[neighbor] == UNREACHABLE:
+                field[neighbor] = next_dist
+                frontier.append(neighbor)
+    return field
+
+
+def repair_distance_field(field: array, goal: int, city, blocked: List[int] = (), freed: List[int] = ()) -> int:
+    """Repair a distance field in place after cells were blocked or freed, returning how many cells changed.
+
+    Newly blocked cells invalidate, in order of increasing distance, every cell that no longer
+    has a neighbor one step closer to the goal. The invalidated cells and any freed cells are
+    then reseeded from their valid neighbors and the new distances propagated outwards.
+    """
+    grid = city.grid
+    offsets = _offsets(city)
+    if goal in blocked or goal in freed:
+        field[:] = distance_field(goal, city)
+        return len(field)
+
+    changed = 0
+    pq = []
+    for cell in blocked:
+        if field[cell] != UNREACHABLE:
+            field[cell] = UNREACHABLE
+            changed += 1
+            for offset in offsets:
+                neighbor = cell + offset
+                if field[neighbor] != UNREACHABLE:
+                    heapq.heappush(pq, (field[neighbor], neighbor))
+
+    invalidated = []
+    while pq:
+        dist, current = heapq.heappop(pq)
+        if field[current] != dist or current == goal:
+            continue  # Already invalidated, or the goal itself
+        if any(field[current + offset] == dist - 1 for offset in offsets):
+            continue  # Still supported by a neighbor one step closer
+        field[current] = UNREACHABLE
+        invalidated.append(current)
+        for offset in offsets:
+            neighbor = current + offset
+            if field[neighbor] == dist + 1:
+                heapq.heappush(pq, (dist + 1, neighbor))
+
+    for cell in invalidated + list(freed):
+        if grid[cell]:
+            continue
+        best = min(field[cell + offset] for offset in offsets)
+        if best != UNREACHABLE:
+            heapq.heappush(pq, (best + 1, cell))
+
+    while pq:
+        dist, current = heapq.heappop(pq)
+        if dist >= field[current]:
+            continue
+        field[current] = dist
+        changed += 1
+        for offset in offsets:
+            neighbor = current + offset
+            if not grid[neighbor] and field[neighbor] > dist + 1:
+                heapq.heappush(pq, (dist + 1, neighbor))
+    return changed
+
+
+class DStarLite:
+    """Incremental planner (D* Lite) from a moving start to a fixed goal.
+
+    The search runs backwards from the goal, so when the start moves or a few cells change
+    only the part of the search those changes invalidate is repaired; cells far from the
+    explored region cost nothing to update.
+    """
+
+    def __init__(self, start: Tuple[int, int], goal: Tuple[int, int], city):
+        self.city = city
+        self.offsets = _offsets(city)
+        self.start = city.cell_index(start)
+        self.goal = city.cell_index(goal)
+        self.last_start = self.start
+        self.km = 0  # Accumulated heuristic shift from start moves, keeps old queue keys valid
+        self.g = {}
+        self.rhs = {self.goal: 0}
+        self.queue = []
+        self.queued = {}  # Node -> key of its live queue entry; other heap entries are stale
+        self.expanded = 0
+        self._push(self.goal)
+
+    def _heuristic(self, a: int, b: int) -> int:
+        ay, ax = divmod(a, self.city.stride)
+        by, bx = divmod(b, self.city.stride)
+        return abs(ax - bx) + abs(ay - by)
+
+    def _key(self, node: int) -> Tuple[float, float]:
+        best = min(self.g.get(node, INFINITY), self.rhs.get(node, INFINITY))
+        return (best + self._heuristic(self.start, node) + self.km, best)
+
+    def _push(self, node: int):
+        key = self._key(node)
+        self.queued[node] = key
+        heapq.heappush(self.queue, (key, node))
+
+    def _update_vertex(self, node: int):
+        grid = self.city.grid
+        if grid[node] == WALL:
+            return
+        if node != self.goal:
+            best = INFINITY
+            for offset in self.offsets:
+                neighbor = node + offset
+                if not grid[neighbor]:
+                    best = min(best, self.g.get(neighbor, INFINITY) + 1)
+            self.rhs[node] = best
+        if self.g.get(node, INFINITY) != self.rhs.get(node, INFINITY):
+            self._push(node)
+        else:
+            self.queued.pop(node, None)
+
+    def _compute_shortest_path(self):
+        queue = self.queue
+        while queue:
+            key, node = queue[0]
+            if self.queued.get(node) != key:
+                heapq.heappop(queue)  # Stale entry
+                continue
+            start_g = self.g.get(self.start, INFINITY)
+            start_rhs = self.rhs.get(self.start, INFINITY)
+            if not (key < self._key(self.start) or start_rhs != start_g):
+                break
+            heapq.heappop(queue)
+            self.expanded += 1
+            new_key = self._key(node)
+            if key < new_key:
+                self._push(node)
+                continue
+            del self.queued[node]
+            if self.g.get(node, INFINITY) > self.rhs.get(node, INFINITY):
+                self.g[node] = self.rhs[node]
+            else:
+                self.g[node] = INFINITY
+                self._update_vertex(node)
+            for offset in self.offsets:
+                self._update_vertex(node + offset)
+
+    def next_position(self, position: Tuple[int, int], changed: List[int] = ()) -> Optional[Tuple[int, int]]:
+        """Repair the search for a new start and any cells whose passability changed, then return the next cell."""
+        self.start = self.city.cell_index(position)
+        if self.start != self.last_start:
+            self.km += self._heuristic(self.last_start, self.start)
+            self.last_start = self.start
+        for cell in changed:
+            # Entering cell got cheaper or dearer for each of its neighbors
+            for offset in self.offsets:
+                self._update_vertex(cell + offset)
+        self._compute_shortest_path()
+
+        if self.start == self.goal or self.g.get(self.start, INFINITY) == INFINITY:
+            return None
+        grid = self.city.grid
+        best = None
+        best_cost = INFINITY
+        for offset in self.offsets:
+            neighbor = self.start + offset
+            if not grid[neighbor] and self.g.get(neighbor, INFINITY) + 1 < best_cost:
+                best = neighbor
+                best_cost = self.g.get(neighbor, INFINITY) + 1
+        return self.city.cell_position(best) if best is not None else None
@@ -1,14 +1,9 @@
+import argparse
 import time
 from threading import Thread
 import webbrowser
-from server import app
-from simulation import simulation
-
-def start_simulation():
-    """Run the simulation steps in the background."""
-    while True:
-        simulation.run_step()  # Run one step of the simulation
-        time.sleep(0.05)  # Delay between simulation steps (50 milliseconds)
+from scheduler import CATCH_UP_POLICIES, SKIP
+from server import app, runner
 
 def open_browser():
     """Open the default web browser to the app's home page."""
@@ -16,15 +11,20 @@ def open_browser():
     webbrowser.open("http://127.0.0.1:5000/")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the simulation and its browser view.")
+    parser.add_argument("--real-time-factor", type=float, default=1.0, help="simulated seconds per wall second")
+    parser.add_argument("--unthrottled", action="store_true", help="step as fast as possible")
+    parser.add_argument("--catch-up", default=SKIP, choices=CATCH_UP_POLICIES, help="what to do with ticks missed after a slow step")
+    args = parser.parse_args()
+    runner.scheduler.configure(args.real_time_factor, args.unthrottled, args.catch_up)
+
     # Start Flask app in a separate thread
     server_thread = Thread(target=lambda: app.run(debug=False, use_reloader=False))
     server_thread.daemon = True  # Ensure the server thread doesn't block the main program
     server_thread.start()
 
-    # Start the simulation in a separate thread
-    simulation_thread = Thread(target=start_simulation)
-    simulation_thread.daemon = True  # Ensure the simulation thread doesn't block the main program
-    simulation_thread.start()
+    # Start the simulation in a separate thread (one step every 50 simulated milliseconds)
+    runner.start()
 
     # Open the browser
     open_browser()
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+from typing import Callable, Dict, Tuple
+
+from scenario import add_random_passenger
+from scheduler import SKIP, TickScheduler
+
+
+class SimulationRunner:
+    """The one place that advances a shared simulation.
+
+    A scheduler.TickScheduler paces the steps (one every interval simulated seconds, scaled by
+    real_time_factor) on an asyncio loop in a background thread, holding lock for the whole
+    step. Anything that reads simulation state from another thread (web requests) takes the
+    same lock, so a reader never sees a half-finished step and viewers cannot change the pace.
+    """
+
+    def __init__(self, simulation, interval: float = 0.05, demand_rate: float = 0.1, real_time_factor: float = 1.0,
+                 catch_up: str = SKIP, unthrottled: bool = False):
+        self.simulation = simulation
+        self.interval = interval  # Simulated seconds per step
+        self.demand_rate = demand_rate  # Chance of a new passenger on each step
+        self.lock = threading.RLock()
+        self.scheduler = TickScheduler(self.step, interval, real_time_factor, catch_up, unthrottled=unthrottled)
+        self.thread = None
+
+    def step(self):
+        """Add demand and run one step under the lock."""
+        with self.lock:
+            add_random_passenger(self.simulation, self.demand_rate)  # New passengers appear as the city runs
+            self.simulation.run_step()
+
+    def run(self):
+        """Step until stop() is called, on an event loop of this thread's own."""
+        asyncio.run(self.scheduler.run())
+
+    def start(self) -> threading.Thread:
+        """Run the steps on a daemon thread, once; later calls return the running thread."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="simulation", daemon=True)
+            self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.scheduler.stop()
+
+
+class FrameCache:
+    """Latest rendering of each kind of frame, produced at most once per step however many viewers ask.
+
+    render() returns (step, frame). Viewers asking for a step that is already cached share it;
+    the first viewer to ask for a newer step renders it while the others of that kind wait.
+    """
+
+    def __init__(self):
+        self.frames: Dict[str, Tuple[int, object]] = {}  # Kind -> (step, frame)
+        self.rendered = 0  # Frames produced
+        self.served = 0  # Frames handed out
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, step: int, render: Callable[[], Tuple[int, object]]):
+        """Return the cached frame of this kind for step (or later), rendering it if needed."""
+        with self._lock:
+            lock = self._locks.setdefault(kind, threading.Lock())
+        with lock:
+            cached = self.frames.get(kind)
+            if cached is None or cached[0] < step:
+                cached = render()
+                with self._lock:
+                    self.frames[kind] = cached
+                    self.rendered += 1
+                    # Frames for older steps are never asked for again
+                    for old in [k for k, (frame_step, _) in self.frames.items() if frame_step < cached[0]]:
+                        del self.frames[old]
+                        self._locks.pop(old, None)
+            with self._lock:
+                self.served += 1
+            return cached[1]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"rendered": self.rendered, "served": self.served, "cached": len(self.frames),
+                    "served_per_render": self.served / self.rendered if self.rendered else 0.0}
@@ -0,0 +1,50 @@
+import random
+from model import City, PublicTransport, Passenger, Simulation
+
+
+def build_simulation(routing_strategy: str = "dijkstra", rng=None) -> Simulation:
+    """Build the default city, its two buses and an empty simulation."""
+    # Define the city
+    city = City(10, 10, bus_stops=[(1, 0), (3, 9), (2, 2), (5, 9), (2, 7), (5, 1), (1, 5), (0, 8)], rng=rng)
+
+    # Create buses
+    bus1 = PublicTransport(id=1, route=[(1, 0), (2, 7), (3, 9), (5, 9)], city=city, routing_strategy=routing_strategy)
+    bus2 = PublicTransport(id=2, route=[(2, 2), (1, 5), (0, 8), (5, 1)], city=city, routing_strategy=routing_strategy)
+
+    # Create the simulation
+    return Simulation(city, buses=[bus1, bus2], passengers=[])
+
+
+def build_random_simulation(width: int, height: int, n_stops: int, fleet: int, route_length: int = 4,
+                            rng=None, routing_strategy: str = "dijkstra") -> Simulation:
+    """Build a synthetic city with randomly placed stops and a fleet of buses whose routes cover every stop."""
+    rng = rng if rng is not None else random.Random()
+    n_stops = min(n_stops, width * height)
+    bus_stops = [(index % width, index // width) for index in rng.sample(range(width * height), n_stops)]
+    city = City(width, height, bus_stops=bus_stops, rng=rng)
+
+    route_length = min(route_length, n_stops)
+    routes = [rng.sample(bus_stops, route_length) for _ in range(fleet)]
+    # Passengers pick any stop as their destination, so every stop must be on some route
+    covered = {stop for route in routes for stop in route}
+    for stop in bus_stops:
+        if stop not in covered:
+            rng.choice(routes).append(stop)
+
+    buses = [PublicTransport(id=i + 1, route=route, city=city, routing_strategy=routing_strategy)
+             for i, route in enumerate(routes)]
+    return Simulation(city, buses=buses, passengers=[], rng=rng)
+
+
+# Function to create and add random passengers during the simulation
+def add_random_passenger(simulation, rate: float = 0.1):
+    """Randomly add a passenger to the simulation."""
+    rng = simulation.rng
+    if rng.random() < rate:  # 10% chance to add a passenger each frame by default
+        passenger_id = simulation.passenger_count + 1  # Unique ID for the new passenger
+        start_pos = rng.choice(simulation.city.bus_stops)
+        destination = rng.choice(simulation.city.bus_stops)
+        passenger = Passenger(id=passenger_id, current_position=start_pos, destination=destination)
+        simulation.passengers.append(passenger)
+        return passenger  # Return the newly added passenger
+    return None
@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+SKIP = "skip"  # After an overrun, drop the ticks that are already late and keep the cadence
+CATCH_UP = "catch_up"  # After an overrun, run the late ticks back to back (up to max_catch_up) to regain real time
+CATCH_UP_POLICIES = [SKIP, CATCH_UP]
+
+
+class TickScheduler:
+    """Call step() at a fixed simulated tick rate from an asyncio event loop.
+
+    Tick deadlines are laid out on an absolute schedule (start + n * period), so the time a step
+    takes does not push later ticks back. period is tick_seconds / real_time_factor: a factor of 2
+    runs the simulation twice as fast as real time. unthrottled runs ticks back to back. Each step
+    runs in a worker thread, so other coroutines on the same loop (a web server) stay responsive.
+    """
+
+    def __init__(self, step: Callable[[], None], tick_seconds: float = 0.05, real_time_factor: float = 1.0,
+                 catch_up: str = SKIP, max_catch_up: int = 5, unthrottled: bool = False, history: int = 1000):
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"unknown catch-up policy {catch_up!r}, expected one of {CATCH_UP_POLICIES}")
+        self.step = step
+        self.tick_seconds = tick_seconds  # Simulated seconds per tick
+        self.real_time_factor = real_time_factor
+        self.catch_up = catch_up
+        self.max_catch_up = max_catch_up  # Most late ticks CATCH_UP runs back to back before skipping the rest
+        self.unthrottled = unthrottled
+        self.paused = False
+        self.ticks = 0
+        self.overruns = 0  # Steps that took longer than the tick period
+        self.skipped = 0  # Ticks dropped to get back on schedule
+        self.lag = 0.0  # Seconds the last tick started after its deadline
+        self.jitter = deque(maxlen=history)  # Recent start delays past the deadline, in seconds
+        self.durations = deque(maxlen=history)  # Recent step times, in seconds
+        self.started = None
+        self.paused_seconds = 0.0  # Wall time spent paused, left out of the achieved real-time factor
+        self.pause_began = None  # perf_counter time the current pause began, while paused
+        self.loop = None
+        self._wake = None
+        self._stopped = False
+
+    @property
+    def period(self) -> float:
+        """Wall seconds between tick deadlines."""
+        return self.tick_seconds / self.real_time_factor
+
+    def _control(self, **changes):
+        """Apply setting changes from any thread and wake the loop so they take effect at once."""
+        for name, value in changes.items():
+            setattr(self, name, value)
+        if self.loop is not None and self._wake is not None:
+            self.loop.call_soon_threadsafe(self._wake.set)
+
+    def pause(self):
+        self._control(paused=True)
+
+    def resume(self):
+        self._control(paused=False)
+
+    def configure(self, real_time_factor: Optional[float] = None, unthrottled: Optional[bool] = None,
+                  catch_up: Optional[str] = None):
+        """Change the pace while running; the schedule restarts from the next tick."""
+        changes = {}
+        if real_time_factor is not None:
+            if real_time_factor <= 0:
+                raise ValueError("real_time_factor must be positive")
+            changes["real_time_factor"] = real_time_factor
+        if unthrottled is not None:
+            changes["unthrottled"] = unthrottled
+        if catch_up is not None:
+            if catch_up not in CATCH_UP_POLICIES:
+                raise ValueError(f"unknown catch-up policy {catch_up!r}")
+            changes["catch_up"] = catch_up
+        self._control(**changes)
+
+    def stop(self):
+        self._control(_stopped=True)
+
+    async def _sleep_until(self, deadline: float) -> bool:
+        """Sleep until the deadline; True if a control change woke us up early."""
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), max(0.0, deadline - self.loop.time()))
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def run(self):
+        """Tick until stop() is called."""
+        self.loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self.started = time.perf_counter()
+        deadline = self.loop.time()
+        settings = (self.real_time_factor, self.unthrottled)
+        while not self._stopped:
+            if self.paused:
+                self._wake.clear()
+                self.pause_began = time.perf_counter()
+                await self._wake.wait()
+                self.paused_seconds += time.perf_counter() - self.pause_began
+                self.pause_began = None
+                deadline = self.loop.time()  # Do not try to make up for the pause
+                continue
+            if (self.real_time_factor, self.unthrottled) != settings:
+                settings = (self.real_time_factor, self.unthrottled)
+                deadline = self.loop.time()  # New pace: restart the schedule now
+            if not self.unthrottled and await self._sleep_until(deadline):
+                continue  # Settings changed while waiting
+
+            begin = self.loop.time()
+            self.lag = begin - deadline if not self.unthrottled else 0.0
+            self.jitter.append(self.lag)
+            await asyncio.to_thread(self.step)
+            duration = self.loop.time() - begin
+            self.durations.append(duration)
+            self.ticks += 1
+
+            if self.unthrottled:
+                deadline = self.loop.time()
+                continue
+            period = self.period
+            if duration > period:
+                self.overruns += 1
+            deadline += period
+            late = int((self.loop.time() - deadline) // period)  # Whole ticks already missed
+            allowed = self.max_catch_up if self.catch_up == CATCH_UP else 0
+            if late > allowed:
+                self.skipped += late - allowed
+                deadline += (late - allowed) * period
+
+    def stats(self) -> Dict:
+        """Pace, jitter and overrun statistics, as plain data."""
+        now = time.perf_counter()
+        paused = self.paused_seconds
+        if self.pause_began is not None:
+            paused += now - self.pause_began  # The pause still going on
+        elapsed = now - self.started - paused if self.started is not None else 0.0
+        jitter = sorted(self.jitter)
+        return {
+            "ticks": self.ticks,
+            "paused": self.paused,
+            "unthrottled": self.unthrottled,
+            "catch_up": self.catch_up,
+            "target_real_time_factor": self.real_time_factor,
+            # Simulated time per wall second since the start; below the target means the simulation is behind
+            "achieved_real_time_factor": self.ticks * self.tick_seconds / elapsed if elapsed else 0.0,
+            "behind": not self.unthrottled and self.lag > self.period,
+            "lag_ms": self.lag * 1000,
+            "overruns": self.overruns,
+            "skipped_ticks": self.skipped,
+            "jitter_ms": {
+                "mean": sum(jitter) / len(jitter) * 1000 if jitter else 0.0,
+                "p99": jitter[min(len(jitter) - 1, int(len(jitter) * 0.99))] * 1000 if jitter else 0.0,
+                "max": jitter[-1] * 1000 if jitter else 0.0,
+            },
+            "step_ms": {
+                "mean": sum(self.durations) / len(self.durations) * 1000 if self.durations else 0.0,
+                "max": max(self.durations) * 1000 if self.durations else 0.0,
+            },
+        }
@@ -1,6 +1,62 @@
-from flask import Flask, render_template, Response
-from simulation import simulation, plot_city,city
+import json
+import threading
+from flask import Flask, render_template, Response, jsonify, request
+from runner import FrameCache, SimulationRunner
+from simulation import simulation
+from state_log import StateLog
 app = Flask(__name__)
+simulation.enable_profiling()  # Per-phase timings are cheap enough to keep on for the dashboard
+simulation.retire_interval = 100  # Archive finished passengers so a long session keeps a bounded working set
+runner = SimulationRunner(simulation)  # The only thing that steps the simulation; requests just read it
+state_log = StateLog(simulation)  # What changed at each step, for the canvas view
+frames = FrameCache()  # Each kind of frame is rendered once per step and shared by every viewer
+streaming = {"clients": 0, "frames_sent": 0, "frames_skipped": 0}  # Totals over all /stream connections
+streaming_lock = threading.Lock()
+KEEPALIVE_SECONDS = 15  # Idle time before a comment line checks that the client is still there
+
+
+def count_stream(**changes):
+    with streaming_lock:
+        for name, change in changes.items():
+            streaming[name] += change
+
+
+def render_state(since):
+    """Serialize the update for clients at step since as a JSON body."""
+    update = state_log.delta(since)
+    return update["step"], json.dumps(update)
+
+
+def render_png():
+    """Draw the latest step as a PNG."""
+    from visualization import plot_snapshot  # Load the plotting stack only once a view is requested
+    snapshot = state_log.snapshot()
+    return snapshot["step"], plot_snapshot(snapshot)
+
+
+def render_event(since):
+    """Serialize the update for viewers at step since as one server-sent event."""
+    update = state_log.delta(since)
+    event = f"id: {update['step']}\ndata: {json.dumps(update, separators=(',', ':'))}\n\n"
+    return update["step"], (update["step"], event)
+
+
+def stream_updates(since):
+    """Yield one server-sent event per update, merging every step the client was too slow to take."""
+    count_stream(clients=1)
+    try:
+        yield "retry: 1000\n\n"  # Reconnect quickly; the browser resends the last event id as Last-Event-ID
+        while True:
+            if since is None or state_log.step != since:
+                step, event = frames.get(f"event:{since}", state_log.step, lambda: render_event(since))
+                skipped = step - since - 1 if since is not None and step > since else 0
+                since = step
+                count_stream(frames_sent=1, frames_skipped=skipped)
+                yield event
+            elif not state_log.wait_for_step(since, KEEPALIVE_SECONDS):
+                yield ": keepalive\n\n"
+    finally:
+        count_stream(clients=-1)
 
 
 @app.route('/')
@@ -10,9 +66,63 @@ def index():
 
 @app.route('/simulate_step')
 def simulate_step():
-    # Perform one simulation step (you can add logic for passenger movement here)
-    img_io = plot_city(city, simulation)
-    return Response(img_io, mimetype='image/png')
+    # Latest step as a PNG, drawn once per step however many clients ask (the runner does the stepping)
+    return Response(frames.get("png", state_log.step, render_png), mimetype='image/png')
+
+@app.route('/state')
+def state():
+    # Changes since the client's last step (?since=N), or a full snapshot for a new client
+    since = request.args.get('since', type=int)
+    body = frames.get(f"state:{since}", state_log.step, lambda: render_state(since))
+    return Response(body, mimetype='application/json')
+
+@app.route('/stream')
+def stream():
+    # Push every committed step as a server-sent event, resuming from Last-Event-ID or ?since=N
+    since = request.headers.get('Last-Event-ID', type=int)
+    if since is None:
+        since = request.args.get('since', type=int)
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_updates(since), mimetype='text/event-stream', headers=headers)
+
+@app.route('/stats')
+def stats():
+    # Per-phase, per-tick and per-routing-call timings of the running simulation
+    with runner.lock:
+        if simulation.profiler is None:
+            report = {"profiling": False, "step": simulation.step_count}
+        else:
+            report = simulation.profiler.stats()
+    report["streaming"] = dict(streaming)
+    report["frames"] = frames.stats()
+    report["clock"] = runner.scheduler.stats()
+    return jsonify(report)
+
+@app.route('/clock', methods=['GET', 'POST'])
+def clock():
+    # Tick pace and lag; POST {"paused", "real_time_factor", "unthrottled", "catch_up"} to change them
+    if request.method == 'POST':
+        settings = request.get_json(force=True) or {}
+        if settings.get("paused") is True:
+            runner.scheduler.pause()
+        elif settings.get("paused") is False:
+            runner.scheduler.resume()
+        try:
+            runner.scheduler.configure(settings.get("real_time_factor"), settings.get("unthrottled"),
+                                       settings.get("catch_up"))
+        except ValueError as error:
+            return jsonify({"error": str(error)}), 400
+    return jsonify(runner.scheduler.stats())
+
+@app.route('/metrics')
+def metrics():
+    # Running counters and histograms of the simulation, cheap to read at any step
+    with runner.lock:
+        report = simulation.metrics.report()
+        report["step"] = simulation.step_count
+        report["passengers"] = {"active": len(simulation.passengers), "archived": len(simulation.archive)}
+    return jsonify(report)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    runner.start()
+    app.run(debug=True, use_reloader=False)
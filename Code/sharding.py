@@ -0,0 +1,357 @@
+import heapq
+from multiprocessing import Pipe, Process
+from typing import Dict, List, Tuple
+
+import events
+from metrics import MetricsAccumulator
+from model import City, Passenger, PublicTransport, Simulation
+from route_index import RouteIndex
+
+
+def _pack_passenger(passenger: Passenger, seq: int) -> Tuple:
+    return (seq, passenger.id, passenger.current_position, passenger.destination, passenger.target_stop,
+            passenger.waiting_time, passenger.max_waiting_time, passenger.journey_complete,
+            passenger.ready_to_board, passenger.start_time, passenger.end_time, passenger.origin)
+
+
+def _unpack_passenger(state: Tuple) -> Tuple[int, Passenger]:
+    (seq, passenger_id, position, destination, target_stop, waiting_time, max_waiting_time,
+     journey_complete, ready_to_board, start_time, end_time, origin) = state
+    passenger = Passenger(passenger_id, position, destination)
+    passenger.origin = origin
+    passenger.target_stop = target_stop
+    passenger.waiting_time = waiting_time
+    passenger.max_waiting_time = max_waiting_time
+    passenger.journey_complete = journey_complete
+    passenger.ready_to_board = ready_to_board
+    passenger.start_time = start_time
+    passenger.end_time = end_time
+    return seq, passenger
+
+
+def _pack_bus(bus: PublicTransport, seq: int, passenger_seq: Dict[Passenger, int]) -> Tuple:
+    """A bus with its load, in boarding order; riders travel with their bus between tiles."""
+    riders = [_pack_passenger(passenger, passenger_seq[passenger]) for passenger in bus.passengers]
+    return (seq, bus.id, bus.route, bus.routing_strategy, bus.position, bus.route_index, bus.path, bus.path_step,
+            bus.path_version, bus.served_stops, bus.total_passenger_loads, bus.routing_calls, bus.nodes_expanded, riders)
+
+
+def _unpack_bus(state: Tuple, city: City) -> Tuple[int, PublicTransport, List[Tuple[int, Passenger]]]:
+    (seq, bus_id, route, routing_strategy, position, route_index, path, path_step, path_version,
+     served_stops, total_passenger_loads, routing_calls, nodes_expanded, riders) = state
+    bus = PublicTransport(bus_id, route, city, routing_strategy)
+    bus.position = position
+    bus.route_index = route_index
+    bus.path = path
+    bus.path_step = path_step
+    bus.path_version = path_version
+    bus.served_stops = served_stops
+    bus.total_passenger_loads = total_passenger_loads
+    bus.routing_calls = routing_calls
+    bus.nodes_expanded = nodes_expanded
+    passengers = []
+    for rider in riders:
+        rider_seq, passenger = _unpack_passenger(rider)
+        bus.board_passenger(passenger)
+        passengers.append((rider_seq, passenger))
+    return seq, bus, passengers
+
+
+class TileWorker:
+    """Simulates the buses and passengers inside one tile of the city.
+
+    Every worker keeps a full copy of the city (blockages are synced from the coordinator at each
+    tick barrier) and the route index of the whole fleet, but only owns the agents in its tile.
+    Agents are kept in the fleet-wide order of the single-process simulation, so boarding picks
+    the same bus and a sharded run makes the same moves as an unsharded one.
+    """
+
+    def __init__(self, tile: Tuple[int, int, int, int], width: int, height: int, bus_stops, routes):
+        self.tile = tile  # (x0, y0, x1, y1), x1 and y1 exclusive
+        self.city = City(width, height, bus_stops)
+        self.simulation = Simulation(self.city, buses=[], passengers=[])
+        self.simulation.route_index = RouteIndex(routes)  # Passengers pick stops on any route, not just local ones
+        self.bus_seq: Dict[PublicTransport, int] = {}
+        self.simulation.bus_seq = self.bus_seq  # Metrics order bus moves as the single-process fleet does
+        self.passenger_seq: Dict[Passenger, int] = {}
+
+    def owns(self, position: Tuple[int, int]) -> bool:
+        x0, y0, x1, y1 = self.tile
+        return x0 <= position[0] < x1 and y0 <= position[1] < y1
+
+    def add_buses(self, packed: List[Tuple]):
+        if not packed:
+            return
+        arrivals = []
+        for state in packed:
+            seq, bus, riders = _unpack_bus(state, self.city)
+            self.bus_seq[bus] = seq
+            arrivals.append(bus)
+            self._add_passengers(riders)
+        self.simulation.buses = list(heapq.merge(self.simulation.buses, sorted(arrivals, key=self.bus_seq.get),
+                                                 key=self.bus_seq.get))
+
+    def _add_passengers(self, arrivals: List[Tuple[int, Passenger]]):
+        if not arrivals:
+            return
+        for seq, passenger in arrivals:
+            self.passenger_seq[passenger] = seq
+        arrivals = [passenger for _, passenger in sorted(arrivals, key=lambda arrival: arrival[0])]
+        self.simulation.passengers = list(heapq.merge(self.simulation.passengers, arrivals, key=self.passenger_seq.get))
+
+    def _remove_passengers(self, leaving: List[Passenger]) -> List[Tuple]:
+        if not leaving:
+            return []
+        packed = [_pack_passenger(passenger, self.passenger_seq.pop(passenger)) for passenger in leaving]
+        gone = set(leaving)
+        self.simulation.passengers = [p for p in self.simulation.passengers if p not in gone]
+        return packed
+
+    def move(self, step: int, blocked_routes, blocked_version: int, passengers: List[Tuple]) -> List[Tuple]:
+        """First half of a tick: take in new and arriving passengers, move the buses, hand over those leaving."""
+        simulation = self.simulation
+        simulation.step_count = step
+        events.step = step
+        if blocked_routes is not None:
+            self.city.sync_blocked_routes({(start, end): value for start, end, value in blocked_routes}, blocked_version)
+        self._add_passengers([_unpack_passenger(state) for state in passengers])
+        simulation.move_buses()
+
+        leaving = [bus for bus in simulation.buses if not self.owns(bus.position)]
+        packed = []
+        for bus in leaving:
+            riders = list(bus.passengers)
+            packed.append(_pack_bus(bus, self.bus_seq.pop(bus), self.passenger_seq))
+            self._remove_passengers(riders)
+            if bus.on_cells_changed in self.city.blockage_listeners:
+                self.city.blockage_listeners.remove(bus.on_cells_changed)
+        if leaving:
+            gone = set(leaving)
+            simulation.buses = [bus for bus in simulation.buses if bus not in gone]
+        return packed
+
+    def update(self, buses: List[Tuple]) -> Tuple[List[Tuple], int]:
+        """Second half of a tick: take in arriving buses, update and board passengers, hand over walkers leaving."""
+        simulation = self.simulation
+        self.add_buses(buses)
+        simulation.buses_at = {}
+        for bus in simulation.buses:
+            simulation.buses_at.setdefault(bus.position, []).append(bus)
+        simulation.metrics.occupied_cells = len(simulation.buses_at)
+
+        completed = simulation.total_passenger_transport
+        simulation.update_passengers()
+        simulation.board_waiting_passengers()
+        completed = simulation.total_passenger_transport - completed
+
+        leaving = [p for p in simulation.passengers if p.on_bus is None and not self.owns(p.current_position)]
+        return self._remove_passengers(leaving), completed
+
+    def metrics(self) -> MetricsAccumulator:
+        return self.simulation.metrics
+
+    def counts(self) -> Tuple[int, int]:
+        return len(self.simulation.buses), len(self.simulation.passengers)
+
+
+def _serve(connection, *args):
+    """Worker process loop: run TileWorker methods named by the coordinator until told to stop."""
+    events.quiet()
+    worker = TileWorker(*args)
+    while True:
+        method, arguments = connection.recv()
+        if method is None:
+            break
+        connection.send(getattr(worker, method)(*arguments))
+    connection.close()
+
+
+class _InlineWorker:
+    """A TileWorker in the coordinator's process, behind the same call interface as a worker process."""
+
+    def __init__(self, *args):
+        self.worker = TileWorker(*args)
+        self.result = None
+
+    def send(self, method: str, *arguments):
+        self.result = getattr(self.worker, method)(*arguments)
+
+    def receive(self):
+        return self.result
+
+    def close(self):
+        pass
+
+
+class _ProcessWorker:
+    def __init__(self, *args):
+        self.connection, child = Pipe()
+        self.process = Process(target=_serve, args=(child, *args), daemon=True)
+        self.process.start()
+        child.close()
+
+    def send(self, method: str, *arguments):
+        self.connection.send((method, arguments))
+
+    def receive(self):
+        return self.connection.recv()
+
+    def close(self):
+        self.connection.send((None, ()))
+        self.process.join()
+
+
+class _PassengerInbox:
+    """Stands in for Simulation.passengers so scenario.add_random_passenger works on a sharded run.
+
+    New passengers are numbered and held until the next step hands them to the tile they start in.
+    """
+
+    def __init__(self, count: int = 0):
+        self.count = count
+        self.pending: List[Passenger] = []
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, passenger: Passenger):
+        self.pending.append(passenger)
+        self.count += 1
+
+
+class ShardedSimulation:
+    """Run a simulation split into tiles_x by tiles_y tiles, one worker process per tile.
+
+    The coordinator keeps the city's blockages and random generator and draws disturbances exactly
+    like Simulation.run_step. Each tick has two barriers: after the buses move (buses that left a
+    tile are handed over with their riders) and after the passengers update (walkers that left a
+    tile are handed over). Blockages are sent to the workers at the start of the tick whenever they
+    changed. Buses and passengers only interact on a shared cell, which always lies in one tile at
+    those barriers, so the result matches the single-process run (D* Lite buses rebuild their
+    planner after a handover and may break ties differently). PassengerEngine is not supported.
+    """
+
+    def __init__(self, simulation: Simulation, tiles_x: int = 2, tiles_y: int = 2, processes: bool = True):
+        if simulation.passenger_engine is not None:
+            raise ValueError("sharded simulations do not support a PassengerEngine")
+        city = simulation.city
+        self.city = city
+        city.blockage_listeners = []  # The coordinator's copy only tracks blockages; no bus plans on it
+        city.distance_fields = {}
+        self.control = Simulation(city, buses=[], passengers=[], rng=simulation.rng)  # Draws the disturbances
+        for name in ("step_count", "unblock_counter", "blockage_interval", "disturbances"):
+            setattr(self.control, name, getattr(simulation, name))
+        self.rng = simulation.rng
+        self.passengers = _PassengerInbox(simulation.passenger_count)
+        self.demand = simulation.demand
+        self.route_index = RouteIndex([bus.route for bus in simulation.buses])  # For demand sources that check routes
+        self.total_passenger_transport = simulation.total_passenger_transport
+        self.base_metrics = simulation.metrics  # Counts gathered before the run was sharded
+        self.base_metrics.occupied_cells = 0
+
+        width, height = city.width, city.height
+        xs = [width * i // tiles_x for i in range(tiles_x + 1)]
+        ys = [height * j // tiles_y for j in range(tiles_y + 1)]
+        self.tiles = [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for j in range(tiles_y) for i in range(tiles_x)]
+        self.tiles_x, self.tiles_y, self.xs, self.ys = tiles_x, tiles_y, xs, ys
+        routes = [bus.route for bus in simulation.buses]
+        worker_type = _ProcessWorker if processes else _InlineWorker
+        self.workers = [worker_type(tile, width, height, city.bus_stops, routes) for tile in self.tiles]
+        self._sent_version = None
+
+        # Hand every agent to the tile it starts in; riders go with their bus
+        passenger_seq = {passenger: seq for seq, passenger in enumerate(simulation.passengers)}
+        buses = [[] for _ in self.tiles]
+        for seq, bus in enumerate(simulation.buses):
+            buses[self.tile_of(bus.position)].append(_pack_bus(bus, seq, passenger_seq))
+        self._walkers = [[] for _ in self.tiles]
+        riding = {passenger for bus in simulation.buses for passenger in bus.passengers}
+        for passenger in simulation.passengers:
+            if passenger not in riding:
+                self._walkers[self.tile_of(passenger.current_position)].append(
+                    _pack_passenger(passenger, passenger_seq[passenger]))
+        for worker, packed in zip(self.workers, buses):
+            worker.send("add_buses", packed)
+        for worker in self.workers:
+            worker.receive()
+
+    def tile_of(self, position: Tuple[int, int]) -> int:
+        """Index of the tile (and worker) that owns a cell."""
+        i = next(i for i in range(self.tiles_x) if position[0] < self.xs[i + 1])
+        j = next(j for j in range(self.tiles_y) if position[1] < self.ys[j + 1])
+        return j * self.tiles_x + i
+
+    @property
+    def step_count(self) -> int:
+        return self.control.step_count
+
+    @property
+    def passenger_count(self) -> int:
+        return len(self.passengers)
+
+    def run_step(self):
+        """Advance every tile by one step, with the same disturbances as Simulation.run_step."""
+        control = self.control
+        control.step_count += 1
+        events.step = control.step_count
+        if self.demand is not None:
+            for origin, destination in self.demand.due(control.step_count, self):
+                if destination is not None:
+                    self.passengers.append(Passenger(self.passenger_count + 1, origin, destination))
+        control.unblock_counter += 1
+        control.add_disturbance()
+        control.fix_routes()
+
+        blocked_routes = None
+        if self.city.blocked_version != self._sent_version:
+            blocked_routes = [(start, end, value) for (start, end), value in self.city.blocked_routes.items()]
+            self._sent_version = self.city.blocked_version
+        for index, passenger in enumerate(self.passengers.pending, len(self.passengers) - len(self.passengers.pending)):
+            self._walkers[self.tile_of(passenger.current_position)].append(_pack_passenger(passenger, index))
+        self.passengers.pending = []
+
+        # Barrier 1: buses have moved; hand over the ones that left their tile, riders included
+        for worker, walkers in zip(self.workers, self._walkers):
+            worker.send("move", control.step_count, blocked_routes, self.city.blocked_version, walkers)
+        buses = [[] for _ in self.workers]
+        for worker in self.workers:
+            for state in worker.receive():
+                buses[self.tile_of(state[4])].append(state)
+
+        # Barrier 2: passengers have moved and boarded; hand over the walkers that left their tile
+        for worker, arriving in zip(self.workers, buses):
+            worker.send("update", arriving)
+        self._walkers = [[] for _ in self.workers]
+        for worker in self.workers:
+            walkers, completed = worker.receive()
+            self.total_passenger_transport += completed
+            for state in walkers:
+                self._walkers[self.tile_of(state[2])].append(state)
+
+    @property
+    def metrics(self) -> MetricsAccumulator:
+        """Metrics of the whole city, merged from every tile."""
+        merged = MetricsAccumulator(self.city.width * self.city.height)
+        merged.merge(self.base_metrics)
+        for worker in self.workers:
+            worker.send("metrics")
+        for worker in self.workers:
+            merged.merge(worker.receive())
+        return merged
+
+    def counts(self) -> List[Tuple[int, int]]:
+        """Buses and passengers held by each tile."""
+        for worker in self.workers:
+            worker.send("counts")
+        return [worker.receive() for worker in self.workers]
+
+    def close(self):
+        """Stop the worker processes."""
+        for worker in self.workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
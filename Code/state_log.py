@@ -0,0 +1,152 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+FORMAT_VERSION = 1  # Bump when the layout of snapshots or deltas changes
+
+
+def _route(start, end) -> List[int]:
+    return [start[0], start[1], end[0], end[1]]
+
+
+class StateLog:
+    """Record what changed in a simulation at each step so viewers can fetch only the difference.
+
+    After every step the log compares bus positions, active passengers and blocked routes with
+    the previous step and keeps the resulting delta in a bounded history. A client that knows
+    step N asks for delta(N) and gets the merged changes up to the current step; a new client,
+    or one that fell further behind than the history, gets a full snapshot instead.
+
+    Every message is plain JSON data with a "version" and a "step":
+      snapshot: {"full": true, "city": {...}, "buses": [[id, x, y]], "passengers": [[id, x, y, dest_x, dest_y]],
+                 "blocked": [[x1, y1, x2, y2]]}
+      delta:    {"full": false, "since": N, "buses": [[id, x, y]], "added": [[id, x, y, dest_x, dest_y]],
+                 "moved": [[id, x, y]], "finished": [id], "blocked": [[x1, y1, x2, y2]], "unblocked": [...]}
+    """
+
+    def __init__(self, simulation, history: int = 600):
+        self.simulation = simulation
+        self.deltas = deque(maxlen=history)  # Per-step deltas, oldest first
+        self.step = simulation.step_count
+        self._bus_positions = {bus.id: bus.position for bus in simulation.buses}
+        self._active = [p for p in simulation.passengers if not p.journey_complete]  # Passengers a viewer draws
+        self._positions = {p.id: p.current_position for p in self._active}
+        self._known = simulation.passenger_count  # Passengers are appended; finished ones may be retired
+        self._blocked = set(simulation.city.blocked_routes)
+        self._blocked_version = simulation.city.blocked_version
+        self._stepped = threading.Condition()  # Notified after each recorded step, for streaming viewers
+        simulation.step_listeners.append(self.record)
+
+    def record(self, simulation):
+        """Store the changes made by the step that just ran and wake the streaming viewers."""
+        with self._stepped:  # Viewers read the log from other threads
+            self._record(simulation)
+            self._stepped.notify_all()
+
+    def _record(self, simulation):
+        simulation.sync_passengers()
+        buses = []
+        for bus in simulation.buses:
+            if self._bus_positions.get(bus.id) != bus.position:
+                self._bus_positions[bus.id] = bus.position
+                buses.append([bus.id, *bus.position])
+
+        added = []
+        for passenger in simulation.passengers[self._known - len(simulation.archive):]:
+            self._active.append(passenger)
+            self._positions[passenger.id] = passenger.current_position
+            added.append([passenger.id, *passenger.current_position, *passenger.destination])
+        self._known = simulation.passenger_count
+
+        moved, finished, active = [], [], []
+        for passenger in self._active:
+            if passenger.journey_complete:
+                finished.append(passenger.id)
+                del self._positions[passenger.id]
+                continue
+            active.append(passenger)
+            if self._positions[passenger.id] != passenger.current_position:
+                self._positions[passenger.id] = passenger.current_position
+                moved.append([passenger.id, *passenger.current_position])
+        self._active = active
+
+        blocked, unblocked = [], []
+        city = simulation.city
+        if city.blocked_version != self._blocked_version:
+            current = set(city.blocked_routes)
+            blocked = [_route(*route) for route in current - self._blocked]
+            unblocked = [_route(*route) for route in self._blocked - current]
+            self._blocked = current
+            self._blocked_version = city.blocked_version
+
+        self.step = simulation.step_count
+        self.deltas.append({"step": self.step, "buses": buses, "added": added, "moved": moved,
+                            "finished": finished, "blocked": blocked, "unblocked": unblocked})
+
+    def wait_for_step(self, after: Optional[int], timeout: Optional[float] = None) -> bool:
+        """Block until a step later than after is recorded; False if the timeout ran out first."""
+        with self._stepped:
+            return self._stepped.wait_for(lambda: self.step != after, timeout)
+
+    def snapshot(self) -> Dict:
+        """Full state as of the latest recorded step."""
+        with self._stepped:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict:
+        city = self.simulation.city
+        return {
+            "version": FORMAT_VERSION,
+            "full": True,
+            "step": self.step,
+            "city": {"width": city.width, "height": city.height, "stops": [list(stop) for stop in city.bus_stops]},
+            "buses": [[bus_id, *position] for bus_id, position in self._bus_positions.items()],
+            "passengers": [[p.id, *self._positions[p.id], *p.destination] for p in self._active],
+            "blocked": [_route(*route) for route in self._blocked],
+        }
+
+    def delta(self, since: Optional[int]) -> Dict:
+        """Changes from step since to the latest step, or a snapshot if since is unknown or too old."""
+        with self._stepped:
+            if since is None or since > self.step or not self.deltas or since < self.deltas[0]["step"] - 1:
+                return self._snapshot()
+            return self._delta(since)
+
+    def _delta(self, since: int) -> Dict:
+        buses, added, moved, finished, routes = {}, {}, {}, set(), {}
+        for delta in self.deltas:
+            if delta["step"] <= since:
+                continue
+            for bus_id, x, y in delta["buses"]:
+                buses[bus_id] = [bus_id, x, y]
+            for passenger in delta["added"]:
+                added[passenger[0]] = list(passenger)
+            for passenger_id, x, y in delta["moved"]:
+                if passenger_id in added:
+                    added[passenger_id][1:3] = [x, y]  # The client has not seen this passenger yet
+                else:
+                    moved[passenger_id] = [passenger_id, x, y]
+            for passenger_id in delta["finished"]:
+                moved.pop(passenger_id, None)
+                if added.pop(passenger_id, None) is None:
+                    finished.add(passenger_id)
+            for change, state in (("blocked", True), ("unblocked", False)):
+                for route in delta[change]:
+                    key = tuple(route)
+                    if routes.get(key, state) != state:
+                        del routes[key]  # Blocked and unblocked again within the window
+                    else:
+                        routes[key] = state
+
+        return {
+            "version": FORMAT_VERSION,
+            "full": False,
+            "since": since,
+            "step": self.step,
+            "buses": list(buses.values()),
+            "added": list(added.values()),
+            "moved": list(moved.values()),
+            "finished": sorted(finished),
+            "blocked": [list(route) for route, state in routes.items() if state],
+            "unblocked": [list(route) for route, state in routes.items() if not state],
+        }
@@ -0,0 +1,146 @@
+import argparse
+import itertools
+import json
+import random
+import statistics
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List
+
+import events
+from scenario import build_random_simulation, add_random_passenger
+
+# Scenario parameters a sweep can vary, with their defaults
+DEFAULT_PARAMETERS = {
+    "grid_size": 10,  # Width and height of the city
+    "n_stops": 8,  # Bus stops placed in the city
+    "fleet": 2,  # Number of buses
+    "route_length": 4,  # Stops per bus route (before covering leftover stops)
+    "demand_rate": 0.1,  # Chance of a new passenger on each step
+    "blockage_interval": 5,  # Steps between random disturbances
+    "steps": 100,  # Steps to simulate
+}
+
+# Metrics reported for every run and aggregated over replications
+METRICS = ["passengers", "completed", "completion_rate", "mean_travel_time", "served_stops", "passenger_loads"]
+
+
+def parameter_grid(**axes: Iterable) -> List[Dict]:
+    """Expand lists of values per parameter into every combination, filling the rest with defaults."""
+    names = list(axes)
+    grid = []
+    for values in itertools.product(*(list(axes[name]) for name in names)):
+        parameters = dict(DEFAULT_PARAMETERS)
+        parameters.update(zip(names, values))
+        grid.append(parameters)
+    return grid
+
+
+def run_replication(parameters: Dict) -> Dict:
+    """Run one seeded simulation in isolation and return its parameters together with its metrics."""
+    rng = random.Random(parameters["seed"])
+    size = parameters["grid_size"]
+    simulation = build_random_simulation(size, size, parameters["n_stops"], parameters["fleet"],
+                                         parameters["route_length"], rng=rng)
+    simulation.blockage_interval = parameters["blockage_interval"]
+    for _ in range(parameters["steps"]):
+        add_random_passenger(simulation, parameters["demand_rate"])
+        simulation.run_step()
+
+    accumulated = simulation.metrics
+    completed = accumulated.passengers_transported
+    metrics = {
+        "passengers": simulation.passenger_count,
+        "completed": completed,
+        "completion_rate": completed / simulation.passenger_count if simulation.passenger_count else 0.0,
+        "mean_travel_time": accumulated.travel_time.mean,
+        "served_stops": accumulated.served_stops,
+        "passenger_loads": accumulated.passenger_loads,
+    }
+    return {"parameters": parameters, "metrics": metrics}
+
+
+def _quiet_worker():
+    """Pool initializer: workers never print agent events."""
+    events.quiet()
+
+
+def sweep(grid: List[Dict], replications: int, base_seed: int = 0, processes: int = None) -> Iterator[Dict]:
+    """Run every parameter combination replications times on a process pool, yielding each run as it finishes.
+
+    Each run gets its own seed (base_seed plus its position in the sweep) and its own random
+    generator, so any single run can be reproduced with run_replication.
+    """
+    runs = []
+    for combination, parameters in enumerate(grid):
+        for replication in range(replications):
+            run = dict(parameters)
+            run["combination"] = combination
+            run["seed"] = base_seed + len(runs)
+            runs.append(run)
+
+    if processes == 1:
+        previous_sink = events.quiet()
+        try:
+            for run in runs:
+                yield run_replication(run)
+        finally:
+            events.set_sink(previous_sink)
+        return
+
+    with Pool(processes, initializer=_quiet_worker) as pool:
+        yield from pool.imap_unordered(run_replication, runs, chunksize=max(1, len(runs) // (8 * (processes or 8))))
+
+
+def aggregate(results: Iterable[Dict]) -> List[Dict]:
+    """Summarize each metric (mean, standard deviation, min, max) per parameter combination."""
+    groups: Dict[int, List[Dict]] = {}
+    for result in results:
+        groups.setdefault(result["parameters"]["combination"], []).append(result)
+
+    summary = []
+    for combination in sorted(groups):
+        runs = groups[combination]
+        parameters = {k: v for k, v in runs[0]["parameters"].items() if k not in ("seed", "combination")}
+        metrics = {}
+        for name in METRICS:
+            values = [run["metrics"][name] for run in runs if run["metrics"][name] is not None]
+            metrics[name] = {
+                "mean": statistics.fmean(values) if values else None,
+                "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+                "min": min(values, default=None),
+                "max": max(values, default=None),
+            }
+        summary.append({"parameters": parameters, "replications": len(runs), "metrics": metrics})
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run seeded simulation replications over a parameter grid in parallel.")
+    parser.add_argument("--grid-size", type=int, nargs="+", default=[DEFAULT_PARAMETERS["grid_size"]])
+    parser.add_argument("--fleet", type=int, nargs="+", default=[DEFAULT_PARAMETERS["fleet"]])
+    parser.add_argument("--demand-rate", type=float, nargs="+", default=[DEFAULT_PARAMETERS["demand_rate"]])
+    parser.add_argument("--blockage-interval", type=int, nargs="+", default=[DEFAULT_PARAMETERS["blockage_interval"]])
+    parser.add_argument("--steps", type=int, default=DEFAULT_PARAMETERS["steps"])
+    parser.add_argument("--replications", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run")
+    parser.add_argument("--processes", type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument("--runs-out", help="also write every run's metrics to this JSON lines file as it finishes")
+    args = parser.parse_args()
+
+    grid = parameter_grid(grid_size=args.grid_size, fleet=args.fleet, demand_rate=args.demand_rate,
+                          blockage_interval=args.blockage_interval, steps=[args.steps])
+    results = []
+    runs_out = open(args.runs_out, "w", encoding="utf-8") if args.runs_out else None
+    try:
+        for result in sweep(grid, args.replications, args.seed, args.processes):
+            results.append(result)
+            if runs_out:
+                runs_out.write(json.dumps(result) + "\n")
+    finally:
+        if runs_out:
+            runs_out.close()
+    print(json.dumps(aggregate(results), indent=2))
+
+
+if __name__ == "__main__":
+    main()
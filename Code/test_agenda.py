@@ -0,0 +1,65 @@
+import random
+
+import events
+from checkpoint import fork
+from scenario import build_simulation, add_random_passenger
+
+
+def run(simulation, steps, rate=0.8):
+    previous_sink = events.quiet()
+    try:
+        for _ in range(steps):
+            add_random_passenger(simulation, rate)
+            simulation.run_step()
+    finally:
+        events.set_sink(previous_sink)
+
+
+def passenger_state(simulation):
+    simulation.sync_passengers()
+    return [(p.id, p.current_position, p.waiting_time, p.journey_complete, p.start_time, p.end_time)
+            for p in simulation.passengers]
+
+
+def retired_pair():
+    """Two identical simulations that have already archived finished passengers."""
+    simulations = []
+    for _ in range(2):
+        simulation = build_simulation("astar", rng=random.Random(1))
+        simulation.retire_interval = 50
+        run(simulation, 400)
+        simulations.append(simulation)
+    assert len(simulations[0].archive) > 0
+    return simulations
+
+
+def test_event_scheduling_enabled_after_retirement_matches_tick_loop():
+    reference, scheduled = retired_pair()
+    scheduled.enable_event_scheduling()
+    run(reference, 200)
+    run(scheduled, 200)
+    assert passenger_state(scheduled) == passenger_state(reference)
+    assert scheduled.metrics.report() == reference.metrics.report()
+
+
+def test_event_scheduling_enabled_on_restored_checkpoint_after_retirement():
+    reference, original = retired_pair()
+    restored = fork(original)
+    restored.enable_event_scheduling()
+    run(reference, 200)
+    run(restored, 200)
+    assert passenger_state(restored) == passenger_state(reference)
+    assert restored.metrics.report() == reference.metrics.report()
+
+
+def test_walker_put_off_a_blocked_bus_finishes_at_destination_on_the_way():
+    # At step 143 passenger 29, put off at a blocked route, walks across their destination towards their old stop
+    reference = build_simulation(rng=random.Random(57))
+    scheduled = build_simulation(rng=random.Random(57))
+    scheduled.enable_event_scheduling()
+    run(reference, 200, rate=0.3)
+    run(scheduled, 200, rate=0.3)
+    walked = [p.id for p in reference.passengers if p.journey_complete and p.start_time is not None and p.end_time is None]
+    assert 29 in walked  # Boarded, then completed the journey on foot
+    assert passenger_state(scheduled) == passenger_state(reference)
+    assert scheduled.metrics.report() == reference.metrics.report()
@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+import events
+from checkpoint import dumps, fork
+from demand import RandomDemand, open_trips, write_binary_trips
+from disturbances import DisturbanceGenerator, Hotspots, time_of_day
+from scenario import build_simulation
+
+
+def run(simulation, steps):
+    previous_sink = events.quiet()
+    try:
+        for _ in range(steps):
+            simulation.run_step()
+    finally:
+        events.set_sink(previous_sink)
+
+
+def outcome(simulation):
+    simulation.sync_passengers()
+    live = sorted((p.id, p.current_position, p.waiting_time, p.journey_complete, p.start_time, p.end_time)
+                  for p in simulation.passengers)
+    return live, sorted(simulation.archive.travel_times()), dict(simulation.city.blocked_routes)
+
+
+def configured(trips_path=None):
+    simulation = build_simulation("astar", rng=random.Random(3))
+    simulation.retire_interval = 40
+    simulation.disturbances = DisturbanceGenerator(simulation.city, Hotspots([(5, 5)]), rate=time_of_day([0.3, 1.0], 50))
+    if trips_path is None:
+        simulation.demand = RandomDemand(0.7)
+    else:
+        stops = simulation.city.bus_stops
+        rng = random.Random(4)
+        write_binary_trips(trips_path, ((i // 2, rng.choice(stops), rng.choice(stops)) for i in range(500)))
+        simulation.demand = open_trips(trips_path)
+    simulation.enable_event_scheduling()
+    return simulation
+
+
+@pytest.mark.parametrize("trips", [False, True])
+def test_restore_keeps_disturbances_demand_and_event_scheduling(tmp_path, trips):
+    original = configured(str(tmp_path / "trips.bin") if trips else None)
+    run(original, 110)
+    restored = fork(original)
+    assert restored.agenda is not None
+    assert len(restored.archive) + len(restored.passengers) == original.passenger_count
+    run(original, 150)
+    run(restored, 150)
+    assert outcome(restored) == outcome(original)
+
+
+def test_dumps_refuses_state_it_cannot_restore():
+    simulation = build_simulation("astar", rng=random.Random(3))
+    simulation.disturbances.rate = lambda step: 0.5
+    with pytest.raises(ValueError):
+        dumps(simulation)
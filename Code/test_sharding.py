@@ -0,0 +1,29 @@
+import random
+
+import events
+from scenario import build_random_simulation
+from sharding import ShardedSimulation
+
+
+def build():
+    simulation = build_random_simulation(16, 16, 12, 5, rng=random.Random(12), routing_strategy="astar")
+    simulation.blockage_interval = 3
+    return simulation
+
+
+def test_sharded_busiest_stop_breaks_ties_like_single_process():
+    previous_sink = events.quiet()
+    try:
+        reference = build()
+        for _ in range(200):
+            reference.run_step()
+        with ShardedSimulation(build(), 2, 2, processes=False) as sharded:
+            for _ in range(200):
+                sharded.run_step()
+            metrics = sharded.metrics
+    finally:
+        events.set_sink(previous_sink)
+    counts = reference.metrics.stop_service
+    assert sum(count == counts[reference.metrics.busiest_stop] for count in counts.values()) > 1  # A tie to break
+    assert metrics.stop_service == counts
+    assert metrics.busiest_stop == reference.metrics.busiest_stop
@@ -0,0 +1,129 @@
+from io import BytesIO
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.animation as animation
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from scenario import add_random_passenger
+
+
+def animate(simulation, frames: int = 100, interval: int = 500):
+    """Step the simulation inside a matplotlib animation and show it."""
+    city = simulation.city
+
+    # Create the plot figure and axis for animation
+    fig, ax = plt.subplots(figsize=(8, 8))
+
+    # Set axis limits and grid
+    ax.set_xlim(0, city.width - 1)
+    ax.set_ylim(0, city.height - 1)
+    ax.set_aspect('equal', adjustable='box')
+    ax.grid(True)
+
+    # Plot bus stops in green
+    stop_x, stop_y = zip(*city.bus_stops)
+    ax.scatter(stop_x, stop_y, color='green', label='Bus Stops', s=100, marker='o')
+
+    # Plot blocked routes in red
+    def plot_blocked_routes():
+        for start, end in city.blocked_routes:
+            start_x, start_y = start
+            end_x, end_y = end
+            ax.plot([start_x, end_x], [start_y, end_y], color='red', linestyle='-', linewidth=2, label="Blocked Route")
+
+    # Plot initial blocked routes
+    plot_blocked_routes()
+
+    # Initialize the buses on the plot
+    bus_markers = [ax.scatter(bus.position[0], bus.position[1], color='blue', s=150, marker='^') for bus in simulation.buses]
+
+    # All passengers share one marker collection, moved in place at each frame
+    passenger_markers = ax.scatter([], [], color='pink', s=150, marker='x')
+
+    def update(frame):
+        # Add a random passenger at each frame
+        add_random_passenger(simulation)
+
+        # Run a simulation step
+        simulation.run_step()
+        simulation.sync_passengers()
+
+        # Update bus positions on the plot
+        bus_positions = [bus.position for bus in simulation.buses]
+        for i, bus in enumerate(bus_positions):
+            bus_markers[i].set_offsets(bus)
+
+        # Update passenger positions on the plot
+        passenger_positions = [passenger.current_position for passenger in simulation.passengers]
+        passenger_markers.set_offsets(np.array(passenger_positions, dtype=float).reshape(-1, 2))
+
+        # Clear the old blocked routes before plotting new ones
+        for line in ax.lines:  # Remove all previous blocked route lines
+            line.remove()
+
+        # Redraw the blocked routes (now updated)
+        plot_blocked_routes()
+
+        # Update the plot title
+        ax.set_title(f"Simulation Step: {frame + 1}")
+
+        return bus_markers + [passenger_markers]  # Return the updated artists for the frame
+
+    # Create the animation using FuncAnimation
+    ani = animation.FuncAnimation(fig, update, frames=frames, interval=interval, repeat=False)
+
+    # Display the animation (in a non-GUI backend)
+    plt.show()
+    return ani
+
+
+# Function to plot the city grid, buses, and passengers
+def plot_snapshot(snapshot) -> bytes:
+    """Draw a state_log snapshot as a PNG (thread-safe: uses its own figure, not pyplot's state)."""
+    city = snapshot["city"]
+    fig = Figure(figsize=(8, 8))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    # Set axis limits and grid
+    ax.set_xlim(0, city["width"] - 1)
+    ax.set_ylim(0, city["height"] - 1)
+    ax.set_aspect('equal', adjustable='box')
+    ax.grid(True)
+
+    # Plot bus stops in green
+    stop_x, stop_y = zip(*city["stops"])
+    ax.scatter(stop_x, stop_y, color='green', label='Bus Stops', s=100, marker='o')
+
+    # Plot blocked routes in red
+    for start_x, start_y, end_x, end_y in snapshot["blocked"]:
+        ax.plot([start_x, end_x], [start_y, end_y], color='red', linestyle='-', linewidth=2, label="Blocked Route")
+
+    # Plot the buses and the passengers still travelling
+    for _, x, y in snapshot["buses"]:
+        ax.scatter(x, y, color='blue', s=150, marker='^')
+    if snapshot["passengers"]:
+        passenger_x = [passenger[1] for passenger in snapshot["passengers"]]
+        passenger_y = [passenger[2] for passenger in snapshot["passengers"]]
+        ax.scatter(passenger_x, passenger_y, color='pink', s=150, marker='x')
+
+    # Update the plot title
+    ax.set_title(f"Simulation Step {snapshot['step']}")
+
+    # Save the plot to a file (in memory)
+    img_io = BytesIO()
+    fig.savefig(img_io, format='png')
+    return img_io.getvalue()
+
+
+def plot_city(city, simulation):
+    """Draw the current state of the simulation as a PNG, without stepping it."""
+    simulation.sync_passengers()
+    snapshot = {
+        "step": simulation.step_count,
+        "city": {"width": city.width, "height": city.height, "stops": city.bus_stops},
+        "buses": [[bus.id, *bus.position] for bus in simulation.buses],
+        "passengers": [[p.id, *p.current_position, *p.destination] for p in simulation.passengers],
+        "blocked": [[*start, *end] for start, end in city.blocked_routes],
+    }
+    return BytesIO(plot_snapshot(snapshot))